@@ -1,132 +1,687 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from datetime import datetime
-import base64
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from functools import partial
+import asyncio
+import codecs
+import json
+import os
+import threading
 import traceback
 
+from app.services.admission import AdmissionController, Overloaded, Ticket
 from app.services.nlp_service import NLPService
-from app.services.report_service import ReportService
-from app.services.gigachat_service import generate_recommendation, find_ads
-from app.db.database import SessionLocal
-from app.db.models import Incident
+from app.services.rule_engine import CompiledRuleSet
+from app.services.rule_registry import RuleRegistry, UnknownRulesVersion
+from app.services.report_store import get_report_store, report_url
+from app.services.gigachat_service import (
+    generate_recommendation, stream_recommendation, find_ads, parse_ad_verdict, text_cache_hash
+)
+from app.services.near_duplicates import NEAR_DUP_ENABLED, SimHashIndex, load_index, simhash, to_signed
+from app.services.ad_classifier import AdClassifier
+from app.db.writer import get_incident_writer
 
 router = APIRouter()
 
-nlp = NLPService("app/rules/rules_v6.yaml")
-report_service = ReportService()
+RULES_DIR = "app/rules"
+RULES_DEFAULT_VERSION = os.getenv("RULES_DEFAULT_VERSION", "v6")
+
+# Сервисы создаются при первом запросе, а не при импорте модуля
+_rule_registry: Optional[RuleRegistry] = None
+_nlp: Optional[NLPService] = None
+_ad_classifier: Optional[AdClassifier] = None
+_ad_classifier_lock = threading.Lock()
+_admission: Optional[AdmissionController] = None
+_near_duplicates: Optional[SimHashIndex] = None
+_near_duplicates_task: Optional[asyncio.Task] = None
+
+
+def get_rule_registry() -> RuleRegistry:
+    global _rule_registry
+    if _rule_registry is None:
+        _rule_registry = RuleRegistry(RULES_DIR, default_version=RULES_DEFAULT_VERSION)
+    return _rule_registry
+
+
+def get_nlp() -> NLPService:
+    global _nlp
+    if _nlp is None:
+        _nlp = NLPService(ruleset=get_rule_registry().get())
+    return _nlp
+
+
+def resolve_ruleset(rules_version: Optional[str]) -> CompiledRuleSet:
+    """Текущий скомпилированный набор правил запрошенной версии."""
+    try:
+        return get_rule_registry().get(rules_version)
+    except UnknownRulesVersion:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Неизвестная версия правил: {rules_version}. Доступны: {', '.join(get_rule_registry().versions())}"
+        )
+
+
+def get_ad_classifier() -> AdClassifier:
+    """
+    Локальный классификатор рекламы. Первая загрузка (sklearn, joblib.load) блокирующая —
+    вызывать из потока executor, а не из event loop.
+    """
+    global _ad_classifier
+    if _ad_classifier is None:
+        with _ad_classifier_lock:
+            if _ad_classifier is None:
+                _ad_classifier = AdClassifier.load()
+    return _ad_classifier
+
+
+def get_admission_controller() -> AdmissionController:
+    global _admission
+    if _admission is None:
+        _admission = AdmissionController()
+    return _admission
+
+
+def client_key(request: Request) -> str:
+    """Идентификатор клиента для лимитов: заголовок X-Client-Id (бот передает пользователя) или IP."""
+    client_id = request.headers.get("X-Client-Id")
+    if client_id:
+        return client_id
+    return request.client.host if request.client else "unknown"
+
+
+async def admit(request: Request) -> Ticket:
+    """Допуск запроса к анализу; при перегрузке — быстрый отказ 429 с Retry-After."""
+    try:
+        return await get_admission_controller().acquire(client_key(request))
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Сервис перегружен: {e.reason}",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+
+def get_near_duplicates() -> SimHashIndex:
+    global _near_duplicates
+    if _near_duplicates is None:
+        _near_duplicates = SimHashIndex()
+    return _near_duplicates
+
+
+async def _load_near_duplicates():
+    try:
+        count = await load_index(get_near_duplicates())
+        print(f"[NearDuplicates] Загружено отпечатков публикаций: {count}")
+    except Exception as e:
+        print(f"[NearDuplicates] Ошибка загрузки отпечатков: {e}")
+
+
+def start_near_duplicates_loading():
+    """Заполняет индекс почти дубликатов сохраненными публикациями в фоне."""
+    global _near_duplicates_task
+    if NEAR_DUP_ENABLED and _near_duplicates_task is None:
+        _near_duplicates_task = asyncio.get_running_loop().create_task(_load_near_duplicates())
+
+
+async def close_services():
+    """Освобождает ресурсы сервисов, если они были созданы."""
+    if _rule_registry is not None:
+        await _rule_registry.stop_watching()
+    if _nlp is not None:
+        _nlp.close()
+    if _near_duplicates_task is not None:
+        await _cancel(_near_duplicates_task)
+
+
+# Ограничения пакетного анализа
+MAX_BATCH_SIZE = int(os.getenv("ANALYZE_MAX_BATCH_SIZE", "5000"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("ANALYZE_BATCH_LLM_CONCURRENCY", "4"))
 
 
 class AnalyzeRequest(BaseModel):
     text: str
+    rules_version: Optional[str] = None  # например "v5"; по умолчанию — RULES_DEFAULT_VERSION
+
+
+class BatchAnalyzeRequest(BaseModel):
+    texts: List[str]
+    rules_version: Optional[str] = None
+    use_llm: bool = False  # проверка рекламы и рекомендации GigaChat для каждого текста
+    with_xlsx: bool = False  # ссылка на XLSX отчет для каждого текста
+
+
+class Fingerprint(NamedTuple):
+    """Отпечаток публикации и найденный почти дубликат."""
+    simhash: int
+    text_key: str  # хеш текста в ключах кэша GigaChat
+    match_key: Optional[str]  # text_key почти дубликата, чьи ответы GigaChat переиспользуются
+    similarity: Optional[float]
+
+
+def fingerprint(text: str) -> Optional[Fingerprint]:
+    """Ищет почти дубликат публикации среди уже проверенных."""
+    if not NEAR_DUP_ENABLED:
+        return None
+    value = simhash(get_nlp().preprocess(text))
+    if value is None:
+        return None
+    match = get_near_duplicates().query(value)
+    match_key, similarity = match if match else (None, None)
+    return Fingerprint(value, text_cache_hash(text), match_key, similarity)
+
+
+def remember(fp: Optional[Fingerprint]):
+    """Добавляет проверенную публикацию в индекс, если у нее еще нет почти дубликата."""
+    if fp is not None and fp.match_key is None:
+        get_near_duplicates().add(fp.simhash, fp.text_key)
+
+
+def publication_fields(fp: Optional[Fingerprint]) -> Optional[Dict[str, Any]]:
+    if fp is None:
+        return None
+    return {"simhash": to_signed(fp.simhash), "text_key": fp.text_key}
+
+
+def near_duplicate_info(fp: Optional[Fingerprint]) -> Optional[Dict[str, Any]]:
+    if fp is None or fp.match_key is None:
+        return None
+    return {"similarity": round(fp.similarity, 3)}
+
+
+def violations_to_incidents(violations: List[dict]) -> List[dict]:
+    """Преобразует violations в incidents для отчета."""
+    incidents = []
+    for violation in violations:
+        law_info = violation.get('law', {})
+        incident_data = {
+            'rule_id': violation.get('rule_id', 'unknown'),
+            'rule_name': violation.get('rule_name', 'Нарушение'),
+            'severity': violation.get('severity', 'medium'),
+            'category': violation.get('category', 'general'),
+            'signal': violation.get('signal', ''),
+            'law': law_info
+        }
+        incidents.append(incident_data)
+    return incidents
+
+
+async def save_ad_check(text: str, is_ad: Optional[bool]):
+    """Ставит вердикт GigaChat (разметку для локального классификатора) в очередь фоновой записи."""
+    if is_ad is None:
+        return
+    try:
+        await get_incident_writer().submit_ad_check(text, is_ad)
+    except Exception as e_db:
+        print("Ошибка при сохранении проверки рекламы:", e_db)
+
+
+def _local_verdict_answer(is_ad: bool) -> str:
+    """Вердикт локальной модели в формате ответа find_ads."""
+    return "Реклама" if is_ad else "Не реклама"
+
+
+async def check_ad(text: str, local_verdict: Optional[bool] = None, use_llm: bool = True,
+                   text_hash: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Проверка «реклама / не реклама»: сначала локальная модель,
+    GigaChat вызывается только если модель не уверена.
+
+    :param local_verdict: уже посчитанный вердикт модели (для батчей)
+    :param use_llm: False — под нагрузкой GigaChat не вызывается, вердикт может остаться None
+    :param text_hash: ключ почти дубликата, чей вердикт GigaChat переиспользуется
+    :return: (вердикт в формате find_ads, источник: "local" или "gigachat")
+    """
+    if local_verdict is None:
+        local_verdict, _ = await asyncio.to_thread(lambda: get_ad_classifier().decide(text))
+    if local_verdict is not None:
+        return _local_verdict_answer(local_verdict), "local"
+    if not use_llm:
+        return None, None
+
+    answer = await find_ads(text, text_hash)
+    await save_ad_check(text, parse_ad_verdict(answer))
+    return answer, "gigachat"
 
 
 # ===== /report endpoint =====
+NOT_AD_RECOMMENDATION = "✅ Текст не является рекламой. Дальнейшая проверка не требуется."
+DEGRADED_RECOMMENDATION = "💡 Рекомендации GigaChat пропущены из-за высокой нагрузки, нарушения найдены по правилам."
+
+
+async def save_incidents(text: str, violations: List[dict], fp: Optional[Fingerprint] = None):
+    """
+    Ставит публикацию и ее нарушения в очередь фоновой записи в БД.
+    Запрос ждет только при заполненной очереди.
+    """
+    try:
+        await get_incident_writer().submit(text, violations, publication_fields(fp))
+    except Exception as e_db:
+        print("Ошибка при сохранении в БД:", e_db)
+        traceback.print_exc()
+
+
+def report_links(report_id: Optional[str]) -> dict:
+    """Поля ответа со ссылкой на отчет; файл строится при первом скачивании."""
+    return {"report_id": report_id, "report_url": report_url(report_id) if report_id else None}
+
+
+async def save_report(violations: List[dict]) -> dict:
+    """Сохраняет отчет по нарушениям и возвращает ссылку на него (без ссылки при ошибке БД)."""
+    try:
+        return report_links(await get_report_store().save(violations))
+    except Exception as e_report:
+        print("Ошибка при сохранении отчета:", e_report)
+        traceback.print_exc()
+        return report_links(None)
+
+
+async def recommend(text: str, incidents: List[dict], use_llm: bool = True,
+                    text_hash: Optional[str] = None) -> str:
+    """Рекомендации GigaChat с текстом-заглушкой при ошибке или перегрузке."""
+    if not use_llm:
+        return DEGRADED_RECOMMENDATION
+    try:
+        return await generate_recommendation(text, incidents, text_hash)
+    except Exception as e_ai:
+        print("Ошибка GigaChat:", e_ai)
+        traceback.print_exc()
+        return "💡 Не удалось получить рекомендации от GigaChat."
+
+
+async def _cancel(*tasks: asyncio.Future):
+    """Отменяет задачи, которые больше не нужны, и дожидается их завершения."""
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def check_and_analyze(text: str, ruleset: CompiledRuleSet, use_llm: bool = True,
+                            text_hash: Optional[str] = None) -> Tuple[Optional[str], Optional[str], Optional[dict]]:
+    """
+    Проверка рекламы (локальная модель, при сомнении — GigaChat) одновременно
+    со спекулятивным NLP-анализом в executor.
+
+    :return: (вердикт, источник вердикта, результат NLP или None, если текст не реклама)
+    """
+    ad_task = asyncio.ensure_future(check_ad(text, use_llm=use_llm, text_hash=text_hash))
+    nlp_task = asyncio.get_running_loop().run_in_executor(None, get_nlp().analyze, text, ruleset)
+
+    ad_check_result = None
+    ad_check_source = None
+    try:
+        ad_check_result, ad_check_source = await ad_task
+    except asyncio.CancelledError:
+        await _cancel(nlp_task)
+        raise
+    except Exception as e_ad_check:
+        print("Ошибка при проверке рекламы через GigaChat:", e_ad_check)
+        traceback.print_exc()
+
+    if parse_ad_verdict(ad_check_result) is False:
+        # Результат NLP больше не нужен
+        await _cancel(nlp_task)
+        return ad_check_result, ad_check_source, None
+
+    return ad_check_result, ad_check_source, await nlp_task
+
+
+def not_ad_response(ad_check_result: Optional[str], ad_check_source: Optional[str]) -> dict:
+    """Ответ для текста, который не является рекламой."""
+    return {
+        "incidents": [],
+        "total_risk": 0,
+        "risk_level": "low",
+        **report_links(None),
+        "recommendations": NOT_AD_RECOMMENDATION,
+        "entities": {},
+        "ad_info": {"is_ad": False, "gigachat_check": ad_check_result},
+        "pd_fields": {},
+        "gigachat_ad_check": ad_check_result,
+        "ad_check_source": ad_check_source
+    }
+
+
+def analysis_summary(nlp_result: dict, incidents: List[dict], ruleset: CompiledRuleSet,
+                     ad_check_result: Optional[str], ad_check_source: Optional[str]) -> dict:
+    """Поля ответа /report, известные сразу после NLP-анализа."""
+    return {
+        "incidents": incidents,
+        "total_risk": nlp_result.get('total_risk', 0),
+        "risk_level": nlp_result.get('risk_level', 'low'),
+        "entities": nlp_result.get('entities', {}),
+        "ad_info": nlp_result.get('ad_info', {}),
+        "pd_fields": nlp_result.get('pd_fields', {}),
+        "rules_version": ruleset.version,
+        "gigachat_ad_check": ad_check_result if ad_check_result else "Проверка не выполнена",
+        "ad_check_source": ad_check_source
+    }
+
+
+def _validate_report_request(req: AnalyzeRequest) -> Tuple[str, CompiledRuleSet]:
+    text = req.text.strip()
+    if not text:
+        raise HTTPException(status_code=400, detail="Текст публикации пустой.")
+    # Версия фиксируется на весь запрос, даже если правила перезагрузятся в процессе
+    return text, resolve_ruleset(req.rules_version)
+
+
 @router.post("/report", response_model=dict)
-async def analyze_report(req: AnalyzeRequest):
+async def analyze_report(req: AnalyzeRequest, request: Request):
+    """
+    Полный анализ публикации.
+
+    Этапы выполняются конвейером: проверка рекламы идет параллельно с NLP-анализом
+    (NLP — в executor, не блокируя event loop), затем запись в БД, сохранение
+    отчета и рекомендации GigaChat выполняются одновременно. XLSX в ответ не
+    входит: report_url ведет на файл, который строится при первом скачивании.
+    Под нагрузкой этапы GigaChat пропускаются (degraded), при перегрузке — 429.
+    """
+    text, ruleset = _validate_report_request(req)
+    ticket = await admit(request)
     try:
-        text = req.text.strip()
-        if not text:
-            raise HTTPException(status_code=400, detail="Текст публикации пустой.")
+        use_llm = not ticket.degraded
+        # Почти дубликат уже проверенной публикации: ответы GigaChat берутся из кэша
+        fp = fingerprint(text)
+        text_hash = fp.match_key if fp else None
 
-        # 1. Проверяем через GigaChat, является ли текст рекламой
-        ad_check_result = None
-        try:
-            ad_check_result = await find_ads(text)
-
-            if ad_check_result == "Не реклама":
-                return {
-                    "incidents": [],
-                    "total_risk": 0,
-                    "risk_level": "low",
-                    "xlsx_base64": None,
-                    "recommendations": "✅ Текст не является рекламой. Дальнейшая проверка не требуется.",
-                    "entities": {},
-                    "ad_info": {"is_ad": False, "gigachat_check": ad_check_result},
-                    "pd_fields": {},
-                    "gigachat_ad_check": ad_check_result
-                }
-        except Exception as e_ad_check:
-            print("Ошибка при проверке рекламы через GigaChat:", e_ad_check)
-            traceback.print_exc()
+        # 1–2. Проверка рекламы и NLP-анализ одновременно
+        ad_check_result, ad_check_source, nlp_result = await check_and_analyze(text, ruleset, use_llm, text_hash)
+        if nlp_result is None:
+            if use_llm:
+                remember(fp)
+            return {
+                **not_ad_response(ad_check_result, ad_check_source),
+                "degraded": ticket.degraded,
+                "near_duplicate": near_duplicate_info(fp),
+            }
 
-        # 2. NLP-анализ
-        nlp_result = nlp.analyze(text)
         violations = nlp_result.get('violations', [])
-        total_risk = nlp_result.get('total_risk', 0)
-        risk_level = nlp_result.get('risk_level', 'low')
-
         # Преобразуем violations в incidents для отчета
-        incidents = []
-        for violation in violations:
-            law_info = violation.get('law', {})
-            incident_data = {
-                'rule_id': violation.get('rule_id', 'unknown'),
-                'rule_name': violation.get('rule_name', 'Нарушение'),
-                'severity': violation.get('severity', 'medium'),
-                'category': violation.get('category', 'general'),
-                'signal': violation.get('signal', ''),
-                'law': law_info
-            }
-            incidents.append(incident_data)
+        incidents = violations_to_incidents(violations)
 
-        # 3. Сохраняем данные в БД
+        # 3–5. БД, отчет и рекомендации GigaChat параллельно
+        db_task = asyncio.ensure_future(save_incidents(text, violations, fp))
+        report_task = asyncio.ensure_future(save_report(violations))
+        recs_task = asyncio.ensure_future(recommend(text, incidents, use_llm, text_hash))
         try:
-            async with SessionLocal() as session:
-                for violation in violations:
-                    law_info = violation.get('law', {})
-
-                    incident = Incident(
-                        text=text,
-                        rule_id=violation.get('rule_id', 'unknown'),
-                        rule_name=violation.get('rule_name', 'Нарушение'),
-                        severity=violation.get('severity', 'medium'),
-                        category=violation.get('category', 'general'),
-                        signal=violation.get('signal', ''),
-                        закон=law_info.get('name', ''),
-                        статья=str(law_info.get('article', '')),
-                        выдержка_описание=law_info.get('excerpt', ''),
-                        штраф=law_info.get('risk', ''),
-                        created_at=datetime.utcnow()
-                    )
-                    session.add(incident)
-
-                await session.commit()
-
-        except Exception as e_db:
-            print("Ошибка при сохранении в БД:", e_db)
-            traceback.print_exc()
+            _, report, recs_ai = await asyncio.gather(db_task, report_task, recs_task)
+        except BaseException:
+            await _cancel(db_task, report_task, recs_task)
+            raise
+        if use_llm:
+            remember(fp)
+
+        return {
+            **analysis_summary(nlp_result, incidents, ruleset, ad_check_result, ad_check_source),
+            **report,
+            "recommendations": recs_ai,
+            "degraded": ticket.degraded,
+            "near_duplicate": near_duplicate_info(fp),
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Ошибка сервера: {e}")
+    finally:
+        ticket.release()
+
+
+# ===== /report/stream endpoint =====
+def sse_event(event: str, data: dict) -> str:
+    """Одно событие Server-Sent Events с JSON-данными."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 
-        # 4. Генерация XLSX
+async def _report_events(text: str, ruleset: CompiledRuleSet, ticket: Ticket):
+    use_llm = not ticket.degraded
+    try:
+        fp = fingerprint(text)
+        text_hash = fp.match_key if fp else None
+        ad_check_result, ad_check_source, nlp_result = await check_and_analyze(text, ruleset, use_llm, text_hash)
+        if nlp_result is None:
+            if use_llm:
+                remember(fp)
+            result = {
+                **not_ad_response(ad_check_result, ad_check_source),
+                "degraded": ticket.degraded,
+                "near_duplicate": near_duplicate_info(fp),
+            }
+            recommendations = result.pop("recommendations")
+            result.pop("report_id")
+            result.pop("report_url")
+            yield sse_event("analysis", result)
+            yield sse_event("recommendation", {"delta": recommendations})
+            yield sse_event("done", {})
+            return
+
+        violations = nlp_result.get('violations', [])
+        incidents = violations_to_incidents(violations)
+        yield sse_event("analysis", {
+            **analysis_summary(nlp_result, incidents, ruleset, ad_check_result, ad_check_source),
+            "degraded": ticket.degraded,
+            "near_duplicate": near_duplicate_info(fp),
+        })
+
+        # БД и отчет сохраняются в фоне, пока GigaChat генерирует рекомендации
+        db_task = asyncio.ensure_future(save_incidents(text, violations, fp))
+        report_task = asyncio.ensure_future(save_report(violations))
         try:
-            xlsx_bytes = report_service.violations_to_xlsx(nlp_result)
-            encoded_xlsx = base64.b64encode(xlsx_bytes).decode('utf-8')
-        except Exception as e_xlsx:
-            print("Ошибка при генерации XLSX:", e_xlsx)
-            traceback.print_exc()
-            encoded_xlsx = None
+            try:
+                if use_llm:
+                    async for delta in stream_recommendation(text, incidents, text_hash):
+                        yield sse_event("recommendation", {"delta": delta})
+                else:
+                    yield sse_event("recommendation", {"delta": DEGRADED_RECOMMENDATION})
+            except Exception as e_ai:
+                print("Ошибка GigaChat:", e_ai)
+                traceback.print_exc()
+                yield sse_event("recommendation", {"delta": "💡 Не удалось получить рекомендации от GigaChat."})
+
+            _, report = await asyncio.gather(db_task, report_task)
+        except BaseException:
+            # Клиент отключился или произошла ошибка — фоновые этапы больше не нужны
+            await _cancel(db_task, report_task)
+            raise
+        if use_llm:
+            remember(fp)
+
+        yield sse_event("report", {**report, "filename": "security_report.xlsx"})
+        yield sse_event("done", {})
+
+    except Exception as e:
+        traceback.print_exc()
+        yield sse_event("error", {"detail": f"Ошибка сервера: {e}"})
+    finally:
+        ticket.release()
+
+
+@router.post("/report/stream")
+async def analyze_report_stream(req: AnalyzeRequest, request: Request):
+    """
+    Полный анализ публикации в виде потока Server-Sent Events.
+
+    События: analysis (нарушения, риск и сущности — сразу после правил),
+    recommendation (фрагменты рекомендаций GigaChat по мере генерации),
+    report (ссылка на XLSX отчет), done; при сбое — error.
+    Место в контроле допуска занято до конца потока.
+    """
+    text, ruleset = _validate_report_request(req)
+    ticket = await admit(request)
+    return StreamingResponse(
+        _report_events(text, ruleset, ticket),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Если поток так и не начался (клиент отключился), место освобождается здесь
+        background=BackgroundTask(ticket.release),
+    )
 
-        # 5. Получение рекомендаций GigaChat
+
+# ===== /batch endpoint =====
+async def _enrich_with_llm(text: str, item: dict, local_verdict: Optional[bool], semaphore: asyncio.Semaphore):
+    """Проверка рекламы и рекомендации GigaChat для одного элемента батча."""
+    async with semaphore:
         try:
-            recs_ai = await generate_recommendation(text, incidents)
+            fp = fingerprint(text)
+            text_hash = fp.match_key if fp else None
+            if fp is not None:
+                item["near_duplicate"] = near_duplicate_info(fp)
+            ad_check_result, item["ad_check_source"] = await check_ad(text, local_verdict, text_hash=text_hash)
+            item["gigachat_ad_check"] = ad_check_result
+            if parse_ad_verdict(ad_check_result) is False:
+                item["incidents"] = []
+                item["total_risk"] = 0
+                item["risk_level"] = "low"
+                item["recommendations"] = NOT_AD_RECOMMENDATION
+                remember(fp)
+                return
+            if item["incidents"]:
+                item["recommendations"] = await generate_recommendation(text, item["incidents"], text_hash)
+            remember(fp)
         except Exception as e_ai:
             print("Ошибка GigaChat:", e_ai)
             traceback.print_exc()
-            recs_ai = "💡 Не удалось получить рекомендации от GigaChat."
+            item["recommendations"] = "💡 Не удалось получить рекомендации от GigaChat."
+
+
+@router.post("/batch", response_model=dict)
+async def analyze_batch(req: BatchAnalyzeRequest, request: Request):
+    """
+    Пакетный анализ публикаций.
+
+    По умолчанию выполняются только правила (максимальная пропускная способность);
+    вызовы GigaChat и ссылки на XLSX отчеты включаются флагами use_llm и with_xlsx.
+    Под нагрузкой use_llm игнорируется (degraded).
+    """
+    if not req.texts:
+        raise HTTPException(status_code=400, detail="Список текстов пуст.")
+    if len(req.texts) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Слишком много текстов: максимум {MAX_BATCH_SIZE}.")
+
+    ruleset = resolve_ruleset(req.rules_version)
+    ticket = await admit(request)
+
+    try:
+        texts = [t.strip() for t in req.texts]
+        indexes = [i for i, t in enumerate(texts) if t]
+
+        # NLP-анализ вне event loop, большие батчи — в пуле процессов
+        loop = asyncio.get_running_loop()
+        nlp_results = await loop.run_in_executor(
+            None, partial(get_nlp().analyze_many, [texts[i] for i in indexes], ruleset=ruleset)
+        )
+
+        items = [{"index": i, "error": "Текст публикации пустой."} for i in range(len(texts))]
+        for i, nlp_result in zip(indexes, nlp_results):
+            item = {
+                "index": i,
+                "incidents": violations_to_incidents(nlp_result.get('violations', [])),
+                "total_risk": nlp_result.get('total_risk', 0),
+                "risk_level": nlp_result.get('risk_level', 'low'),
+                "entities": nlp_result.get('entities', {}),
+                "ad_info": nlp_result.get('ad_info', {}),
+                "pd_fields": nlp_result.get('pd_fields', {}),
+            }
+            items[i] = item
+
+        if req.with_xlsx:
+            # Отчеты всего батча — одной транзакцией; файлы строятся при скачивании
+            report_ids = await get_report_store().save_many([r.get('violations', []) for r in nlp_results])
+            for i, report_id in zip(indexes, report_ids):
+                items[i].update(report_links(report_id))
+
+        if req.use_llm and not ticket.degraded:
+            # Локальная модель оценивает весь батч одной матричной операцией
+            batch_texts = [texts[i] for i in indexes]
+            local_verdicts = await loop.run_in_executor(
+                None, lambda: get_ad_classifier().decide_many(batch_texts)
+            )
+            semaphore = asyncio.Semaphore(BATCH_LLM_CONCURRENCY)
+            await asyncio.gather(*(
+                _enrich_with_llm(texts[i], items[i], verdict, semaphore)
+                for i, (verdict, _) in zip(indexes, local_verdicts)
+            ))
 
         return {
-            "incidents": incidents,
-            "total_risk": total_risk,
-            "risk_level": risk_level,
-            "xlsx_base64": encoded_xlsx,
-            "recommendations": recs_ai,
-            "entities": nlp_result.get('entities', {}),
-            "ad_info": nlp_result.get('ad_info', {}),
-            "pd_fields": nlp_result.get('pd_fields', {}),
-            "gigachat_ad_check": ad_check_result if ad_check_result else "Проверка не выполнена"
+            "count": len(items),
+            "rules_version": ruleset.version,
+            "degraded": req.use_llm and ticket.degraded,
+            "items": items
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Ошибка сервера: {e}")
+    finally:
+        ticket.release()
+
+
+# ===== /chunked endpoint =====
+@router.post("/chunked", response_model=dict)
+async def analyze_chunked(request: Request, rules_version: Optional[str] = None):
+    """
+    Потоковый анализ длинного текста (text/plain, UTF-8) без загрузки тела целиком.
+
+    Возвращает только правила и сущности; нарушения содержат spans со смещениями
+    совпадений в исходном тексте. Вызовы GigaChat и XLSX не выполняются.
+    """
+    ruleset = resolve_ruleset(rules_version)
+    ticket = await admit(request)
+
+    try:
+        analysis = get_nlp().stream_analysis(ruleset)
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+        async for body_chunk in request.stream():
+            chunk = decoder.decode(body_chunk)
+            if chunk:
+                # Разбор фрагмента — CPU-работа, выполняем вне event loop
+                await asyncio.to_thread(analysis.feed, chunk)
+        analysis.feed(decoder.decode(b'', final=True))
+
+        nlp_result = analysis.finish()
+        if nlp_result['length'] == 0:
+            raise HTTPException(status_code=400, detail="Текст публикации пустой.")
+
+        return {
+            "incidents": violations_to_incidents(nlp_result['violations']),
+            "spans": {v['rule_id']: v['spans'] for v in nlp_result['violations']},
+            "total_risk": nlp_result['total_risk'],
+            "risk_level": nlp_result['risk_level'],
+            "entities": nlp_result['entities'],
+            "ad_info": nlp_result['ad_info'],
+            "pd_fields": nlp_result['pd_fields'],
+            "length": nlp_result['length'],
+            "rules_version": ruleset.version,
         }
 
     except HTTPException:
         raise
     except Exception as e:
         traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Ошибка сервера: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Ошибка сервера: {e}")
+    finally:
+        ticket.release()
+
+
+# ===== /rules endpoint =====
+@router.get("/rules", response_model=dict)
+async def list_rule_versions():
+    """Доступные версии правил и версия по умолчанию."""
+    registry = get_rule_registry()
+    return {
+        "versions": registry.versions(),
+        "default": registry.default_version,
+    }
+
+
+# ===== /load endpoint =====
+@router.get("/load", response_model=dict)
+async def admission_stats():
+    """Текущая нагрузка: выполняющиеся и ожидающие запросы, оценка задержки очереди."""
+    return get_admission_controller().stats()
@@ -0,0 +1,70 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse, JSONResponse
+from pydantic import BaseModel
+
+from app.services.incident_export import EXPORT_MEDIA_TYPES, get_export_jobs, is_export_id
+
+router = APIRouter()
+
+
+class IncidentExportRequest(BaseModel):
+    format: str = "xlsx"  # xlsx, csv или parquet
+    since: Optional[datetime] = None  # created_at >= since
+    until: Optional[datetime] = None  # created_at < until
+    rule_id: Optional[str] = None
+    severity: Optional[str] = None
+    category: Optional[str] = None
+    include_text: bool = False  # текст публикации в каждой строке
+    group_sheets: bool = False  # листы по правилам и категориям (только XLSX)
+
+
+def export_links(export_id: str) -> dict:
+    return {
+        "export_id": export_id,
+        "status_url": f"/api/v1/exports/{export_id}",
+        "download_url": f"/api/v1/exports/{export_id}/file",
+    }
+
+
+@router.post('/incidents', status_code=202)
+async def start_incident_export(req: IncidentExportRequest):
+    """
+    Запускает выгрузку нарушений в фоне и сразу возвращает ее ID.
+    Ход выгрузки — status_url, готовый файл — download_url.
+    """
+    filters = {"rule_id": req.rule_id, "severity": req.severity, "category": req.category,
+               "since": req.since, "until": req.until}
+    try:
+        export_id = await get_export_jobs().start(req.format, filters, req.include_text, req.group_sheets)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return export_links(export_id)
+
+
+async def _get_status(export_id: str) -> dict:
+    status = await get_export_jobs().status(export_id) if is_export_id(export_id) else None
+    if status is None:
+        raise HTTPException(status_code=404, detail="Выгрузка не найдена.")
+    return status
+
+
+@router.get('/{export_id}', response_model=dict)
+async def get_export_status(export_id: str):
+    """Состояние выгрузки: queued, running, done или failed, и число записанных строк."""
+    return {**await _get_status(export_id), **export_links(export_id)}
+
+
+@router.get('/{export_id}/file')
+async def download_export(export_id: str):
+    """Готовый файл выгрузки (отдается потоково); пока выгрузка не готова — 409."""
+    status = await _get_status(export_id)
+    if status["status"] != "done":
+        return JSONResponse(status_code=409, content={**status, **export_links(export_id)})
+    fmt = status["format"]
+    path = get_export_jobs().file_path(export_id, fmt)
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Файл выгрузки удален.")
+    return FileResponse(path, media_type=EXPORT_MEDIA_TYPES[fmt], filename=f"incidents_{export_id[:8]}.{fmt}")
@@ -1,15 +1,124 @@
-from fastapi import APIRouter
-from typing import List
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, or_, select
+
+from app.db.database import SessionLocal
+from app.db.models import Incident, Publication
+from app.db.repository import add_incident, incident_conditions
 
 router = APIRouter()
 
-_INCIDENTS = []
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 10000
 
-@router.get('/', response_model=List[dict])
-async def list_incidents():
-    return _INCIDENTS
 
-@router.post('/', response_model=dict)
-async def add_incident(item: dict):
-    _INCIDENTS.append(item)
+def encode_cursor(created_at: datetime, incident_id: int) -> str:
+    """Курсор страницы — (created_at, id) последнего отданного нарушения."""
+    raw = f"{created_at.isoformat()}|{incident_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created_at, incident_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(created_at), int(incident_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Некорректный курсор.")
+
+
+def incident_to_dict(row: Mapping[str, Any]) -> Dict[str, Any]:
+    """Строка таблицы incidents (и, если выбран, текст публикации) в формате API."""
+    item = {
+        'id': row['id'],
+        'publication_id': row['publication_id'],
+        'rule_id': row['rule_id'],
+        'rule_name': row['rule_name'],
+        'severity': row['severity'],
+        'category': row['category'],
+        'signal': row['signal'],
+        'law': {
+            'name': row['закон'],
+            'article': row['статья'],
+            'excerpt': row['выдержка_описание'],
+            'risk': row['штраф'],
+        },
+        'created_at': row['created_at'].isoformat() if row['created_at'] else None,
+    }
+    if 'text' in row:
+        item['text'] = row['text']
     return item
+
+
+@router.get('/')
+async def list_incidents(
+    rule_id: Optional[str] = None,
+    severity: Optional[str] = None,
+    category: Optional[str] = None,
+    publication_id: Optional[int] = None,
+    since: Optional[datetime] = Query(None, description="created_at >= since"),
+    until: Optional[datetime] = Query(None, description="created_at < until"),
+    cursor: Optional[str] = Query(None, description="next_cursor предыдущей страницы"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    include_text: bool = False,
+):
+    """
+    Нарушения из БД, от новых к старым, с постраничной выборкой по курсору.
+
+    Страница отдается потоковым JSON `{"items": [...], "next_cursor": ...}`:
+    строки читаются курсором БД и не собираются в память целиком.
+    """
+    conditions = incident_conditions(rule_id, severity, category, publication_id, since, until)
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        conditions.append(or_(
+            Incident.created_at < cursor_created_at,
+            and_(Incident.created_at == cursor_created_at, Incident.id < cursor_id),
+        ))
+
+    # Столбцы, а не ORM-объекты: строки не копятся в identity map сессии
+    columns = [Incident.__table__, Publication.text] if include_text else [Incident.__table__]
+    stmt = select(*columns).where(*conditions).order_by(Incident.created_at.desc(), Incident.id.desc())
+    if include_text:
+        stmt = stmt.join(Publication, Publication.id == Incident.publication_id)
+    # Лишняя строка показывает, есть ли следующая страница
+    stmt = stmt.limit(limit + 1)
+
+    return StreamingResponse(_stream_page(stmt, limit), media_type="application/json")
+
+
+async def _stream_page(stmt, limit: int):
+    yield '{"items": ['
+    count = 0
+    last = None
+    has_more = False
+    async with SessionLocal() as session:
+        result = await session.stream(stmt)
+        async for row in result:
+            if count == limit:
+                has_more = True
+                break
+            last = row._mapping
+            yield (',' if count else '') + json.dumps(incident_to_dict(last), ensure_ascii=False)
+            count += 1
+        await result.close()
+
+    next_cursor = encode_cursor(last['created_at'], last['id']) if has_more else None
+    yield f'], "next_cursor": {json.dumps(next_cursor)}}}'
+
+
+@router.post('/', response_model=dict)
+async def add_incident_item(item: dict):
+    """
+    Сохраняет нарушение вручную.
+    Поля как у нарушения из анализа (rule_id, rule_name, severity, category, signal, law) и text публикации.
+    """
+    text = (item.get('text') or '').strip()
+    if not text:
+        raise HTTPException(status_code=400, detail="Не указан text публикации.")
+    incident_id, publication_id = await add_incident(text, item)
+    return {**item, 'id': incident_id, 'publication_id': publication_id}
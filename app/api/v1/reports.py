@@ -0,0 +1,44 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, Response
+
+from app.services.report_service import REPORT_FORMATS, REPORT_MEDIA_TYPES
+from app.services.report_store import get_report_store, is_report_id
+
+router = APIRouter()
+
+# Содержимое отчета по ID не меняется: клиенты и прокси могут кэшировать его без перепроверки
+REPORT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == '*':
+        return True
+    return any(tag.strip().removeprefix('W/') == etag for tag in if_none_match.split(','))
+
+
+@router.get('/{report_id}.{fmt}')
+async def download_report(report_id: str, fmt: str, request: Request):
+    """
+    Файл отчета (xlsx, csv или json).
+    Строится при первом скачивании и кэшируется на диске; отдается потоково,
+    при совпадении If-None-Match — 304 без чтения файла.
+    """
+    if fmt not in REPORT_FORMATS or not is_report_id(report_id):
+        raise HTTPException(status_code=404, detail="Отчет не найден.")
+
+    store = get_report_store()
+    etag = store.etag(report_id, fmt)
+    headers = {"ETag": etag, "Cache-Control": REPORT_CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    path = await store.get_file(report_id, fmt)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Отчет не найден.")
+    return FileResponse(
+        path,
+        media_type=REPORT_MEDIA_TYPES[fmt],
+        filename=f"security_report.{fmt}",
+        headers=headers,
+    )
@@ -0,0 +1,39 @@
+from datetime import date
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from app.db.rollups import ROLLUP_DIMENSIONS, query_rollups
+
+router = APIRouter()
+
+
+@router.get('/incidents', response_model=dict)
+async def incident_stats(
+    group_by: List[str] = Query(["day"], description="day, rule_id, severity, category"),
+    since: Optional[date] = Query(None, description="первый день, включительно"),
+    until: Optional[date] = Query(None, description="последний день, включительно"),
+    rule_id: Optional[str] = None,
+    severity: Optional[str] = None,
+    category: Optional[str] = None,
+):
+    """
+    Число нарушений по дням, правилам, уровням и категориям.
+
+    Читаются только агрегаты incident_rollups: время ответа зависит от числа
+    дней и сочетаний полей, а не от размера истории нарушений.
+    """
+    unknown = [name for name in group_by if name not in ROLLUP_DIMENSIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Неизвестные поля группировки: {', '.join(unknown)}.")
+    group_by = list(dict.fromkeys(group_by))
+
+    items = await query_rollups(
+        group_by, since, until,
+        filters={"rule_id": rule_id, "severity": severity, "category": category},
+    )
+    return {
+        "group_by": group_by,
+        "total": sum(item["count"] for item in items),
+        "items": items,
+    }
@@ -1,6 +1,27 @@
-from app.db.database import engine, Base
+import os
+from pathlib import Path
+
+from app.db.database import engine
+
+# Применять миграции при старте API (0 — миграции запускаются отдельно: `alembic upgrade head`)
+DB_MIGRATE_ON_STARTUP = os.getenv("DB_MIGRATE_ON_STARTUP", "1") == "1"
+ALEMBIC_INI = Path(__file__).resolve().parent.parent.parent / "alembic.ini"
+
+
+def _upgrade(connection):
+    """Применяет миграции Alembic на соединении приложения."""
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(str(ALEMBIC_INI))
+    config.set_main_option("script_location", str(ALEMBIC_INI.parent / "app" / "db" / "migrations"))
+    config.attributes["connection"] = connection
+    command.upgrade(config, "head")
+
 
 async def init_db():
+    if not DB_MIGRATE_ON_STARTUP:
+        return
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    print("✅ База данных и таблицы созданы")
+        await conn.run_sync(_upgrade)
+    print("✅ Миграции базы данных применены")
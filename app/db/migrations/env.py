@@ -0,0 +1,56 @@
+"""
+Окружение Alembic.
+
+При старте API миграции выполняются на соединении приложения
+(config.attributes["connection"], см. app/db/init_db.py); из командной
+строки (`alembic upgrade head`) создается собственный асинхронный движок по DATABASE_URL.
+"""
+import asyncio
+
+from alembic import context
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db.database import Base, DATABASE_URL
+from app.db import models  # noqa: F401 — регистрирует таблицы в Base.metadata
+
+config = context.config
+target_metadata = Base.metadata
+
+# Ключ advisory-блокировки Postgres: миграции нескольких воркеров выполняются по очереди
+MIGRATION_LOCK_ID = 7215031
+
+
+def do_run_migrations(connection):
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        # SQLite не умеет ALTER COLUMN — операции batch пересоздают таблицу
+        render_as_batch=connection.dialect.name == "sqlite",
+    )
+    with context.begin_transaction():
+        if connection.dialect.name == "postgresql":
+            connection.exec_driver_sql(f"SELECT pg_advisory_xact_lock({MIGRATION_LOCK_ID})")
+        context.run_migrations()
+
+
+async def run_async_migrations():
+    engine = create_async_engine(DATABASE_URL)
+    async with engine.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+    await engine.dispose()
+
+
+def run_migrations_offline():
+    context.configure(url=DATABASE_URL, target_metadata=target_metadata, literal_binds=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        do_run_migrations(connection)
+    else:
+        asyncio.run(run_async_migrations())
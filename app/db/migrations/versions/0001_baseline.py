@@ -0,0 +1,55 @@
+"""Исходная схема: incidents (с текстом публикации) и ad_checks
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+
+Базы, созданные до миграций через create_all, уже содержат эти таблицы —
+создаются только отсутствующие.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'incidents' not in existing:
+        op.create_table(
+            'incidents',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('text', sa.Text()),
+            sa.Column('rule_id', sa.String()),
+            sa.Column('rule_name', sa.String()),
+            sa.Column('severity', sa.String()),
+            sa.Column('category', sa.String()),
+            sa.Column('signal', sa.String()),
+            sa.Column('закон', sa.String()),
+            sa.Column('статья', sa.String()),
+            sa.Column('выдержка_описание', sa.Text()),
+            sa.Column('штраф', sa.Text()),
+            sa.Column('created_at', sa.DateTime()),
+        )
+        op.create_index('ix_incidents_id', 'incidents', ['id'])
+        op.create_index('ix_incidents_rule_id', 'incidents', ['rule_id'])
+
+    if 'ad_checks' not in existing:
+        op.create_table(
+            'ad_checks',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('text', sa.Text()),
+            sa.Column('is_ad', sa.Boolean()),
+            sa.Column('created_at', sa.DateTime()),
+        )
+        op.create_index('ix_ad_checks_id', 'ad_checks', ['id'])
+        op.create_index('ix_ad_checks_is_ad', 'ad_checks', ['is_ad'])
+
+
+def downgrade():
+    op.drop_table('ad_checks')
+    op.drop_table('incidents')
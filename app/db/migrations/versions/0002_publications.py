@@ -0,0 +1,100 @@
+"""Публикации хранятся один раз, incidents ссылаются на них по publication_id
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+import hashlib
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# Текстов в одном INSERT при переносе
+BATCH_SIZE = 1000
+
+
+def _content_hash(text: str) -> str:
+    # Копия на момент миграции: изменения app.db.repository не должны менять уже примененную миграцию
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def upgrade():
+    bind = op.get_bind()
+    existing = set(sa.inspect(bind).get_table_names())
+
+    if 'publications' not in existing:
+        op.create_table(
+            'publications',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('content_hash', sa.String(64), nullable=False),
+            sa.Column('text', sa.Text(), nullable=False),
+            sa.Column('created_at', sa.DateTime()),
+            sa.Column('last_seen_at', sa.DateTime()),
+        )
+        op.create_index('ix_publications_id', 'publications', ['id'])
+        op.create_index('ix_publications_content_hash', 'publications', ['content_hash'], unique=True)
+
+    columns = {c['name'] for c in sa.inspect(bind).get_columns('incidents')}
+    if 'text' not in columns:
+        return
+
+    if 'publication_id' not in columns:
+        with op.batch_alter_table('incidents') as batch:
+            batch.add_column(sa.Column('publication_id', sa.Integer()))
+
+    # Перенос текстов: одна публикация на уникальный текст; тексты читаются курсором пачками
+    now = datetime.utcnow()
+    insert_publications = sa.text(
+        "INSERT INTO publications (content_hash, text, created_at, last_seen_at) "
+        "VALUES (:hash, :text, :now, :now) ON CONFLICT (content_hash) DO NOTHING"
+    )
+    texts = bind.execute(
+        sa.text("SELECT DISTINCT text FROM incidents WHERE text IS NOT NULL")
+        .execution_options(stream_results=True, yield_per=BATCH_SIZE)
+    )
+    for partition in texts.partitions(BATCH_SIZE):
+        bind.execute(insert_publications, [
+            {"hash": _content_hash(publication_text), "text": publication_text, "now": now}
+            for (publication_text,) in partition
+        ])
+
+    # Ссылки на публикации — одним UPDATE по всей таблице
+    if bind.dialect.name == 'postgresql':
+        op.execute(
+            "UPDATE incidents SET publication_id = publications.id "
+            "FROM publications WHERE publications.text = incidents.text"
+        )
+    else:
+        # SQLite не умеет UPDATE ... FROM в старых версиях: подзапрос по временному индексу
+        op.create_index('ix_publications_text_tmp', 'publications', ['text'])
+        op.execute(
+            "UPDATE incidents SET publication_id = "
+            "(SELECT id FROM publications WHERE publications.text = incidents.text) WHERE text IS NOT NULL"
+        )
+        op.drop_index('ix_publications_text_tmp', table_name='publications')
+
+    with op.batch_alter_table('incidents') as batch:
+        batch.drop_column('text')
+        batch.create_index('ix_incidents_publication_id', ['publication_id'])
+        batch.create_foreign_key(
+            'fk_incidents_publication_id', 'publications', ['publication_id'], ['id'], ondelete='CASCADE'
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('incidents') as batch:
+        batch.add_column(sa.Column('text', sa.Text()))
+    op.execute(
+        "UPDATE incidents SET text = (SELECT text FROM publications WHERE publications.id = incidents.publication_id)"
+    )
+    with op.batch_alter_table('incidents') as batch:
+        batch.drop_constraint('fk_incidents_publication_id', type_='foreignkey')
+        batch.drop_index('ix_incidents_publication_id')
+        batch.drop_column('publication_id')
+    op.drop_table('publications')
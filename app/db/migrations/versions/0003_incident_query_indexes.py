@@ -0,0 +1,32 @@
+"""Составные индексы incidents для постраничной выборки по created_at с фильтрами
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    'ix_incidents_created_at_id': ['created_at', 'id'],
+    'ix_incidents_rule_id_created_at_id': ['rule_id', 'created_at', 'id'],
+    'ix_incidents_severity_created_at_id': ['severity', 'created_at', 'id'],
+    'ix_incidents_category_created_at_id': ['category', 'created_at', 'id'],
+}
+
+
+def upgrade():
+    for name, columns in INDEXES.items():
+        op.create_index(name, 'incidents', columns)
+    # Покрывается ix_incidents_rule_id_created_at_id
+    op.drop_index('ix_incidents_rule_id', table_name='incidents')
+
+
+def downgrade():
+    op.create_index('ix_incidents_rule_id', 'incidents', ['rule_id'])
+    for name in INDEXES:
+        op.drop_index(name, table_name='incidents')
@@ -0,0 +1,25 @@
+"""SimHash и ключ кэша GigaChat для поиска почти дубликатов публикаций
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('publications') as batch:
+        batch.add_column(sa.Column('simhash', sa.BigInteger()))
+        batch.add_column(sa.Column('text_key', sa.String(64)))
+
+
+def downgrade():
+    with op.batch_alter_table('publications') as batch:
+        batch.drop_column('text_key')
+        batch.drop_column('simhash')
@@ -0,0 +1,37 @@
+"""Агрегаты нарушений по дням, правилам, уровням и категориям
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'incident_rollups',
+        sa.Column('day', sa.Date(), primary_key=True),
+        sa.Column('rule_id', sa.String(), primary_key=True),
+        sa.Column('severity', sa.String(), primary_key=True),
+        sa.Column('category', sa.String(), primary_key=True),
+        sa.Column('incident_count', sa.Integer(), nullable=False, server_default='0'),
+    )
+
+    # Счетчики для уже сохраненных нарушений
+    day = "date(created_at)" if op.get_bind().dialect.name == 'sqlite' else "CAST(created_at AS DATE)"
+    op.execute(
+        "INSERT INTO incident_rollups (day, rule_id, severity, category, incident_count) "
+        f"SELECT {day}, COALESCE(rule_id, 'unknown'), COALESCE(severity, 'medium'), "
+        "COALESCE(category, 'general'), COUNT(*) "
+        "FROM incidents WHERE created_at IS NOT NULL GROUP BY 1, 2, 3, 4"
+    )
+
+
+def downgrade():
+    op.drop_table('incident_rollups')
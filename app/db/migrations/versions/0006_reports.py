@@ -0,0 +1,26 @@
+"""Отчеты по нарушениям, скачиваемые по ID
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'reports',
+        sa.Column('id', sa.String(64), primary_key=True),
+        sa.Column('rows', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime()),
+    )
+
+
+def downgrade():
+    op.drop_table('reports')
@@ -0,0 +1,20 @@
+"""Индекс reports.created_at для удаления устаревших отчетов
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_reports_created_at', 'reports', ['created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_reports_created_at', table_name='reports')
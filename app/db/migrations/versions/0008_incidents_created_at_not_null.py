@@ -0,0 +1,43 @@
+"""incidents.created_at NOT NULL: без него строка не попадает в выборку по курсору (created_at, id)
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    is_sqlite = op.get_bind().dialect.name == 'sqlite'
+    # Время нарушения без даты — время сохранения публикации, иначе текущее (UTC, как datetime.utcnow)
+    now = "CURRENT_TIMESTAMP" if is_sqlite else "timezone('utc', now())"
+    backfill = (
+        "COALESCE((SELECT publications.created_at FROM publications "
+        f"WHERE publications.id = incidents.publication_id), {now})"
+    )
+    day = f"date({backfill})" if is_sqlite else f"CAST({backfill} AS DATE)"
+
+    # Такие нарушения не вошли в incident_rollups (0005) — добавляем их к агрегатам
+    op.execute(
+        "INSERT INTO incident_rollups (day, rule_id, severity, category, incident_count) "
+        f"SELECT {day}, COALESCE(rule_id, 'unknown'), COALESCE(severity, 'medium'), "
+        "COALESCE(category, 'general'), COUNT(*) "
+        "FROM incidents WHERE created_at IS NULL GROUP BY 1, 2, 3, 4 "
+        "ON CONFLICT (day, rule_id, severity, category) "
+        "DO UPDATE SET incident_count = incident_rollups.incident_count + excluded.incident_count"
+    )
+    op.execute(f"UPDATE incidents SET created_at = {backfill} WHERE created_at IS NULL")
+
+    with op.batch_alter_table('incidents') as batch:
+        batch.alter_column('created_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('incidents') as batch:
+        batch.alter_column('created_at', existing_type=sa.DateTime(), nullable=True)
@@ -1,14 +1,37 @@
 # models.py
-from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Date, DateTime, Boolean, ForeignKey, Index
 from datetime import datetime
 from app.db.database import Base
 
+
+class Publication(Base):
+    """Текст публикации, хранится один раз; ключ — SHA-256 текста."""
+    __tablename__ = "publications"
+
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String(64), unique=True, index=True, nullable=False)
+    text = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_seen_at = Column(DateTime, default=datetime.utcnow)
+    # Отпечаток для поиска почти дубликатов (app/services/near_duplicates.py)
+    simhash = Column(BigInteger)
+    # Хеш нормализованного текста в ключах кэша GigaChat
+    text_key = Column(String(64))
+
+
 class Incident(Base):
     __tablename__ = "incidents"
+    # Индексы под постраничную выборку (created_at, id) с фильтром по одному полю
+    __table_args__ = (
+        Index("ix_incidents_created_at_id", "created_at", "id"),
+        Index("ix_incidents_rule_id_created_at_id", "rule_id", "created_at", "id"),
+        Index("ix_incidents_severity_created_at_id", "severity", "created_at", "id"),
+        Index("ix_incidents_category_created_at_id", "category", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    text = Column(Text)
-    rule_id = Column(String, index=True)
+    publication_id = Column(Integer, ForeignKey("publications.id", ondelete="CASCADE"), index=True)
+    rule_id = Column(String)
     rule_name = Column(String)
     severity = Column(String)
     category = Column(String)
@@ -17,4 +40,42 @@ class Incident(Base):
     статья = Column(String)  # law_article  
     выдержка_описание = Column(Text)  # law_excerpt
     штраф = Column(Text)  # law_risk
-    created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    # Часть ключа курсора (created_at, id) — всегда заполнено
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class IncidentRollup(Base):
+    """
+    Число нарушений за день по правилу, уровню и категории.
+    Обновляется в той же транзакции, что и incidents; пересборка — `python -m app.db.rollups rebuild`.
+    """
+    __tablename__ = "incident_rollups"
+
+    day = Column(Date, primary_key=True)
+    rule_id = Column(String, primary_key=True)
+    severity = Column(String, primary_key=True)
+    category = Column(String, primary_key=True)
+    incident_count = Column(Integer, nullable=False, default=0)
+
+
+class Report(Base):
+    """
+    Отчет по нарушениям публикации: строки отчета в JSON.
+    ID — хеш строк, одинаковые отчеты хранятся один раз; файлы строятся при скачивании.
+    created_at обновляется при каждом повторном сохранении: по нему удаляются устаревшие отчеты.
+    """
+    __tablename__ = "reports"
+
+    id = Column(String(64), primary_key=True)
+    rows = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class AdCheck(Base):
+    """Вердикт GigaChat «реклама / не реклама» — разметка для локального классификатора."""
+    __tablename__ = "ad_checks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    text = Column(Text)
+    is_ad = Column(Boolean, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,194 @@
+import hashlib
+import json
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.database import SessionLocal, engine
+from app.db.models import AdCheck, Incident, IncidentRollup, Publication, Report
+
+# (текст публикации, нарушения, время, дополнительные столбцы публикации)
+IncidentRecord = Tuple[str, List[Dict[str, Any]], datetime, Optional[Dict[str, Any]]]
+# (текст, вердикт GigaChat, время)
+AdCheckRecord = Tuple[str, bool, datetime]
+
+
+def content_hash(text: str) -> str:
+    """Ключ публикации — SHA-256 текста."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _dialect_insert(dialect: str):
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+    return sqlite_insert
+
+
+async def upsert_publication(session: AsyncSession, text: str, now: Optional[datetime] = None,
+                             fields: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Сохраняет публикацию, если такой еще нет, одним INSERT ... ON CONFLICT.
+    :param fields: дополнительные столбцы публикации (например, simhash)
+    :return: ID публикации
+    """
+    now = now or datetime.utcnow()
+    fields = fields or {}
+    stmt = _dialect_insert(engine.dialect.name)(Publication).values(
+        content_hash=content_hash(text), text=text, created_at=now, last_seen_at=now, **fields
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Publication.content_hash],
+        set_={"last_seen_at": now, **fields}
+    ).returning(Publication.id)
+    return (await session.execute(stmt)).scalar_one()
+
+
+def incident_rows(publication_id: int, violations: List[Dict[str, Any]], now: datetime) -> List[Dict[str, Any]]:
+    """Строки incidents для нарушений одной публикации."""
+    rows = []
+    for violation in violations:
+        law_info = violation.get('law', {})
+        rows.append({
+            'publication_id': publication_id,
+            'rule_id': violation.get('rule_id', 'unknown'),
+            'rule_name': violation.get('rule_name', 'Нарушение'),
+            'severity': violation.get('severity', 'medium'),
+            'category': violation.get('category', 'general'),
+            'signal': violation.get('signal', ''),
+            'закон': law_info.get('name', ''),
+            'статья': str(law_info.get('article', '')),
+            'выдержка_описание': law_info.get('excerpt', ''),
+            'штраф': law_info.get('risk', ''),
+            'created_at': now,
+        })
+    return rows
+
+
+def incident_conditions(rule_id: Optional[str] = None, severity: Optional[str] = None,
+                        category: Optional[str] = None, publication_id: Optional[int] = None,
+                        since: Optional[datetime] = None, until: Optional[datetime] = None) -> List[Any]:
+    """Условия WHERE для выборки incidents; until не включается."""
+    conditions = []
+    for column, value in ((Incident.rule_id, rule_id), (Incident.severity, severity),
+                          (Incident.category, category), (Incident.publication_id, publication_id)):
+        if value is not None:
+            conditions.append(column == value)
+    if since is not None:
+        conditions.append(Incident.created_at >= since)
+    if until is not None:
+        conditions.append(Incident.created_at < until)
+    return conditions
+
+
+def rollup_rows(rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Строки incidents, сгруппированные в приращения incident_rollups."""
+    counts = Counter(
+        (row['created_at'].date(), row['rule_id'], row['severity'], row['category']) for row in rows
+    )
+    # Порядок ключей одинаков во всех транзакциях: параллельные воркеры блокируют строки без взаимоблокировок
+    return [
+        {'day': day, 'rule_id': rule_id, 'severity': severity, 'category': category, 'incident_count': count}
+        for (day, rule_id, severity, category), count in sorted(counts.items())
+    ]
+
+
+async def update_rollups(session: AsyncSession, rows: List[Dict[str, Any]]):
+    """Прибавляет новые нарушения к счетчикам incident_rollups одним executemany."""
+    increments = rollup_rows(rows)
+    if not increments:
+        return
+    stmt = _dialect_insert(engine.dialect.name)(IncidentRollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[IncidentRollup.day, IncidentRollup.rule_id, IncidentRollup.severity, IncidentRollup.category],
+        set_={"incident_count": IncidentRollup.incident_count + stmt.excluded["incident_count"]}
+    )
+    await session.execute(stmt, increments)
+
+
+async def save_incident_batch(session: AsyncSession, records: Iterable[IncidentRecord]) -> int:
+    """
+    Сохраняет нарушения нескольких публикаций: upsert каждого уникального текста
+    и один executemany для всех incidents и счетчиков incident_rollups. Коммит — на вызывающей стороне.
+    :return: Число сохраненных нарушений
+    """
+    publication_ids: Dict[str, int] = {}
+    rows = []
+    for text, violations, created_at, fields in records:
+        if text not in publication_ids:
+            publication_ids[text] = await upsert_publication(session, text, created_at, fields)
+        rows.extend(incident_rows(publication_ids[text], violations, created_at))
+    if rows:
+        await session.execute(insert(Incident), rows)
+        await update_rollups(session, rows)
+    return len(rows)
+
+
+async def save_ad_checks(session: AsyncSession, records: List[AdCheckRecord]):
+    """Сохраняет вердикты GigaChat (разметку классификатора) одним executemany. Коммит — на вызывающей стороне."""
+    if records:
+        await session.execute(insert(AdCheck), [
+            {'text': text, 'is_ad': is_ad, 'created_at': created_at} for text, is_ad, created_at in records
+        ])
+
+
+async def save_publication_incidents(text: str, violations: List[Dict[str, Any]],
+                                     fields: Optional[Dict[str, Any]] = None):
+    """Сохраняет публикацию и ее нарушения в одной транзакции."""
+    async with SessionLocal() as session:
+        await save_incident_batch(session, [(text, violations, datetime.utcnow(), fields)])
+        await session.commit()
+
+
+async def add_incident(text: str, violation: Dict[str, Any]) -> Tuple[int, int]:
+    """
+    Сохраняет одно нарушение сразу (без очереди записи).
+    :return: (ID нарушения, ID публикации)
+    """
+    now = datetime.utcnow()
+    async with SessionLocal() as session:
+        publication_id = await upsert_publication(session, text, now)
+        row = incident_rows(publication_id, [violation], now)[0]
+        incident_id = (await session.execute(insert(Incident).values(**row).returning(Incident.id))).scalar_one()
+        await update_rollups(session, [row])
+        await session.commit()
+    return incident_id, publication_id
+
+
+async def save_reports(reports: Dict[str, List[List[Any]]]):
+    """
+    Сохраняет строки отчетов по ID одним executemany.
+    У уже сохраненных отчетов строки не меняются, обновляется только created_at:
+    отчеты, которые продолжают выдаваться, не удаляются по сроку хранения.
+    """
+    if not reports:
+        return
+    now = datetime.utcnow()
+    stmt = _dialect_insert(engine.dialect.name)(Report)
+    stmt = stmt.on_conflict_do_update(index_elements=[Report.id], set_={"created_at": stmt.excluded["created_at"]})
+    values = [
+        {'id': report_id, 'rows': json.dumps(rows, ensure_ascii=False), 'created_at': now}
+        for report_id, rows in reports.items()
+    ]
+    async with SessionLocal() as session:
+        await session.execute(stmt, values)
+        await session.commit()
+
+
+async def load_report(report_id: str) -> Optional[List[List[Any]]]:
+    """Строки отчета или None, если такого отчета нет."""
+    async with SessionLocal() as session:
+        rows = (await session.execute(select(Report.rows).where(Report.id == report_id))).scalar_one_or_none()
+    return json.loads(rows) if rows is not None else None
+
+
+async def delete_reports_before(cutoff: datetime) -> int:
+    """Удаляет отчеты, сохраненные раньше cutoff; возвращает число удаленных."""
+    async with SessionLocal() as session:
+        result = await session.execute(delete(Report).where(Report.created_at < cutoff))
+        await session.commit()
+    return result.rowcount
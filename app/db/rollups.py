@@ -0,0 +1,104 @@
+"""
+Агрегаты нарушений (incident_rollups): пересборка и чтение.
+
+Счетчики обновляются при записи incidents (app/db/repository.py). Пересборка
+нужна после загрузки старых данных или ручных правок incidents:
+
+    python -m app.db.rollups rebuild [--since 2026-01-01]
+"""
+import argparse
+import asyncio
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import Date, cast, delete, func, insert, select
+
+from app.db.database import IS_SQLITE, SessionLocal
+from app.db.models import Incident, IncidentRollup
+
+# Поля, по которым можно группировать статистику
+ROLLUP_DIMENSIONS = ("day", "rule_id", "severity", "category")
+
+
+def _incident_day():
+    # SQLite хранит DATE строкой 'YYYY-MM-DD', CAST AS DATE там дал бы число
+    return func.date(Incident.created_at) if IS_SQLITE else cast(Incident.created_at, Date)
+
+
+async def rebuild_rollups(since: Optional[date] = None) -> int:
+    """
+    Пересчитывает incident_rollups по таблице incidents (с дня since включительно или целиком)
+    одним INSERT ... SELECT ... GROUP BY в транзакции.
+    :return: Число строк агрегатов
+    """
+    # Значения по умолчанию — как у incident_rows для нарушений без этих полей
+    key = (
+        _incident_day(),
+        func.coalesce(Incident.rule_id, 'unknown'),
+        func.coalesce(Incident.severity, 'medium'),
+        func.coalesce(Incident.category, 'general'),
+    )
+    source = select(*key, func.count()).where(Incident.created_at.isnot(None)).group_by(*key)
+    clear = delete(IncidentRollup)
+    if since is not None:
+        source = source.where(Incident.created_at >= datetime.combine(since, datetime.min.time()))
+        clear = clear.where(IncidentRollup.day >= since)
+
+    async with SessionLocal() as session:
+        await session.execute(clear)
+        await session.execute(insert(IncidentRollup).from_select(
+            ["day", "rule_id", "severity", "category", "incident_count"], source
+        ))
+        await session.commit()
+        count_stmt = select(func.count()).select_from(IncidentRollup)
+        if since is not None:
+            count_stmt = count_stmt.where(IncidentRollup.day >= since)
+        return (await session.execute(count_stmt)).scalar_one()
+
+
+async def query_rollups(group_by: Sequence[str], since: Optional[date] = None, until: Optional[date] = None,
+                        filters: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
+    """
+    Число нарушений по агрегатам, сгруппированное по полям group_by (из ROLLUP_DIMENSIONS).
+    Таблица incidents не читается.
+    :param until: последний день включительно
+    """
+    columns = [getattr(IncidentRollup, name) for name in group_by]
+    stmt = select(*columns, func.sum(IncidentRollup.incident_count).label("count"))
+    if since is not None:
+        stmt = stmt.where(IncidentRollup.day >= since)
+    if until is not None:
+        stmt = stmt.where(IncidentRollup.day <= until)
+    for name, value in (filters or {}).items():
+        if value is not None:
+            stmt = stmt.where(getattr(IncidentRollup, name) == value)
+    if columns:
+        stmt = stmt.group_by(*columns).order_by(*columns)
+
+    async with SessionLocal() as session:
+        rows = (await session.execute(stmt)).mappings().all()
+
+    items = []
+    for row in rows:
+        item = {name: row[name] for name in group_by}
+        if 'day' in item:
+            item['day'] = item['day'].isoformat()
+        item['count'] = int(row['count'] or 0)
+        items.append(item)
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Агрегаты нарушений")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_rebuild = sub.add_parser("rebuild", help="пересчитать агрегаты по таблице incidents")
+    p_rebuild.add_argument("--since", type=date.fromisoformat, help="первый пересчитываемый день, YYYY-MM-DD")
+
+    args = parser.parse_args()
+    count = asyncio.run(rebuild_rollups(args.since))
+    print(f"✅ Агрегаты пересчитаны: {count} строк")
+
+
+if __name__ == "__main__":
+    main()
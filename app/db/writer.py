@@ -0,0 +1,168 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Union
+
+from app.db.database import SessionLocal
+from app.db.repository import IncidentRecord, save_ad_checks, save_incident_batch, save_publication_incidents
+
+# Максимум публикаций в очереди; при заполнении запросы ждут (backpressure)
+PERSIST_QUEUE_SIZE = int(os.getenv("PERSIST_QUEUE_SIZE", "1000"))
+# Публикаций в одной транзакции
+PERSIST_BATCH_SIZE = int(os.getenv("PERSIST_BATCH_SIZE", "100"))
+# Максимальная задержка записи, секунды
+PERSIST_FLUSH_INTERVAL = float(os.getenv("PERSIST_FLUSH_INTERVAL", "0.5"))
+# Повторы транзакции при ошибке БД (например, database is locked)
+PERSIST_RETRIES = int(os.getenv("PERSIST_RETRIES", "3"))
+
+
+class AdCheckItem(NamedTuple):
+    """Вердикт GigaChat в очереди записи (разметка для локального классификатора)."""
+    text: str
+    is_ad: bool
+    created_at: datetime
+
+
+QueueItem = Union[IncidentRecord, AdCheckItem]
+
+
+class IncidentWriter:
+    """
+    Фоновая запись нарушений и вердиктов GigaChat в БД (write-behind).
+
+    Запросы только ставят записи в ограниченную очередь; воркер сохраняет их
+    пачками в одной транзакции — по размеру пачки или по таймеру.
+    При остановке очередь дописывается до конца.
+    """
+
+    def __init__(self, queue_size: int = PERSIST_QUEUE_SIZE, batch_size: int = PERSIST_BATCH_SIZE,
+                 flush_interval: float = PERSIST_FLUSH_INTERVAL, retries: int = PERSIST_RETRIES):
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.dropped = 0
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.is_running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, text: str, violations: List[Dict[str, Any]],
+                     publication_fields: Optional[Dict[str, Any]] = None):
+        """
+        Ставит нарушения публикации в очередь записи.
+        Ждет, только если очередь заполнена; без запущенного воркера пишет сразу.
+        """
+        if not violations:
+            return
+        if not self.is_running:
+            await save_publication_incidents(text, violations, publication_fields)
+            return
+        await self._queue.put((text, violations, datetime.utcnow(), publication_fields))
+
+    async def submit_ad_check(self, text: str, is_ad: bool):
+        """Ставит вердикт GigaChat в очередь записи; без запущенного воркера пишет сразу."""
+        item = AdCheckItem(text, is_ad, datetime.utcnow())
+        if not self.is_running:
+            await self._flush([item])
+            return
+        await self._queue.put(item)
+
+    async def stop(self):
+        """Дописывает очередь и останавливает воркер."""
+        if not self.is_running:
+            return
+        # None — сигнал остановки; встает в очередь после всех уже принятых записей
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+        # Записи, принятые уже после сигнала остановки
+        leftover = [item for item in iter_queue(self._queue) if item is not None]
+        if leftover:
+            await self._flush(leftover)
+        print(f"[IncidentWriter] Остановлен: записано {self.written}, потеряно {self.dropped}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "written": self.written,
+            "dropped": self.dropped,
+        }
+
+    # ====== Воркер ======
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            batch: List[QueueItem] = []
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch.append(item)
+
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                if self._queue.empty():
+                    # asyncio.wait не отменяет get() при таймауте сам — отменяем до того,
+                    # как он заберет запись, поэтому записи не теряются
+                    getter = asyncio.ensure_future(self._queue.get())
+                    done, _ = await asyncio.wait({getter}, timeout=timeout)
+                    if not done:
+                        getter.cancel()
+                        break
+                    item = getter.result()
+                else:
+                    item = self._queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[QueueItem]):
+        ad_checks = [item for item in batch if isinstance(item, AdCheckItem)]
+        records = [item for item in batch if not isinstance(item, AdCheckItem)]
+        for attempt in range(1, self.retries + 1):
+            try:
+                async with SessionLocal() as session:
+                    count = await save_incident_batch(session, records)
+                    await save_ad_checks(session, ad_checks)
+                    await session.commit()
+                self.written += count
+                return
+            except Exception as e:
+                print(f"[IncidentWriter] Ошибка записи пачки ({len(batch)} записей), попытка {attempt}: {e}")
+                if attempt < self.retries:
+                    await asyncio.sleep(0.1 * 2 ** attempt)
+
+        self.dropped += sum(len(record[1]) for record in records) + len(ad_checks)
+
+
+def iter_queue(queue: asyncio.Queue):
+    """Забирает из очереди все записи без ожидания."""
+    while not queue.empty():
+        yield queue.get_nowait()
+
+
+_writer: Optional[IncidentWriter] = None
+
+
+def get_incident_writer() -> IncidentWriter:
+    global _writer
+    if _writer is None:
+        _writer = IncidentWriter()
+    return _writer
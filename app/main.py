@@ -1,11 +1,22 @@
+import asyncio
+import os
 from fastapi import FastAPI
-from app.api.v1 import analyze, incidents
+from app.api.v1 import analyze, exports, incidents, reports, stats
 from app.db.init_db import init_db
+from app.db.writer import get_incident_writer
+from app.services.incident_export import get_export_jobs
+from app.services.gigachat_service import init_gigachat_client, close_gigachat_client
+
+# Прогрев сервисов при старте (по умолчанию выключен — быстрый холодный старт)
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "0") == "1"
 
 app = FastAPI(title="AI Impulse - Audit API")
 
 app.include_router(analyze.router, prefix="/api/v1/analyze", tags=["analyze"])
 app.include_router(incidents.router, prefix="/api/v1/incidents", tags=["incidents"])
+app.include_router(stats.router, prefix="/api/v1/stats", tags=["stats"])
+app.include_router(reports.router, prefix="/api/v1/reports", tags=["reports"])
+app.include_router(exports.router, prefix="/api/v1/exports", tags=["exports"])
 
 @app.get("/")
 async def root():
@@ -18,3 +29,28 @@ async def startup_event():
         await init_db()
     except Exception as e:
         print(f"⚠️ Ошибка инициализации базы: {e}")
+
+    # Фоновая запись нарушений пачками (БД вне пути запроса)
+    get_incident_writer().start()
+
+    # Общий клиент GigaChat с пулом соединений (SDK импортируется здесь, а не при импорте модуля)
+    await init_gigachat_client()
+
+    if WARMUP_ON_STARTUP:
+        analyze.get_nlp()
+        await asyncio.to_thread(analyze.get_ad_classifier)
+
+    # Горячая перезагрузка правил из app/rules
+    analyze.get_rule_registry().start_watching()
+
+    # Индекс почти дубликатов заполняется из БД в фоне, запросы обслуживаются сразу
+    analyze.start_near_duplicates_loading()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await analyze.close_services()
+    await get_export_jobs().close()
+    # Дописываем очередь нарушений до закрытия остальных ресурсов
+    await get_incident_writer().stop()
+    await close_gigachat_client()
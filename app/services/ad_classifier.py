@@ -0,0 +1,216 @@
+"""
+Локальный классификатор рекламы перед вызовом GigaChat find_ads.
+
+Хешированные n-граммы символов + логистическая регрессия. GigaChat вызывается
+только для текстов, где уверенность модели ниже порога.
+
+Обучение и оценка на сохраненных в БД проверках:
+    python -m app.services.ad_classifier train
+    python -m app.services.ad_classifier evaluate
+"""
+import argparse
+import asyncio
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+AD_CLASSIFIER_PATH = os.getenv("AD_CLASSIFIER_PATH", "./ad_classifier.joblib")
+# Порог уверенности: P(реклама) >= порога — реклама, <= 1 - порога — не реклама
+AD_CLASSIFIER_THRESHOLD = float(os.getenv("AD_CLASSIFIER_THRESHOLD", "0.9"))
+
+
+def build_pipeline():
+    """Создает необученный конвейер: хешированные n-граммы + линейная модель."""
+    # sklearn импортируется только при обучении/загрузке модели
+    from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import Pipeline
+
+    return Pipeline([
+        ('hashing', HashingVectorizer(
+            analyzer='char_wb',
+            ngram_range=(2, 4),
+            n_features=2 ** 18,
+            alternate_sign=False,
+            lowercase=True,
+        )),
+        ('tfidf', TfidfTransformer(sublinear_tf=True)),
+        ('model', LogisticRegression(max_iter=1000, class_weight='balanced')),
+    ])
+
+
+class AdClassifier:
+    """Обертка над обученной моделью с порогом уверенности."""
+
+    def __init__(self, pipeline=None, threshold: float = AD_CLASSIFIER_THRESHOLD,
+                 metrics: Optional[Dict[str, Any]] = None):
+        self.pipeline = pipeline
+        self.threshold = threshold
+        self.metrics = metrics or {}
+
+    @property
+    def is_ready(self) -> bool:
+        return self.pipeline is not None
+
+    @classmethod
+    def load(cls, path: str = AD_CLASSIFIER_PATH, threshold: float = AD_CLASSIFIER_THRESHOLD) -> "AdClassifier":
+        """Загружает модель; если файла нет, возвращает неготовый классификатор (всегда «не уверен»)."""
+        if not Path(path).exists():
+            print(f"[AdClassifier] Модель не найдена: {path}, все проверки рекламы идут в GigaChat")
+            return cls(threshold=threshold)
+
+        try:
+            import joblib
+
+            data = joblib.load(path)
+            print(f"[AdClassifier] Загружена модель из: {path}")
+            return cls(data['pipeline'], threshold, data.get('metrics'))
+        except Exception as e:
+            print(f"[AdClassifier] Ошибка загрузки модели: {e}")
+            return cls(threshold=threshold)
+
+    def save(self, path: str = AD_CLASSIFIER_PATH):
+        import joblib
+
+        joblib.dump({
+            'pipeline': self.pipeline,
+            'metrics': self.metrics,
+            'trained_at': datetime.utcnow().isoformat(),
+        }, path)
+
+    def predict_proba_many(self, texts: Sequence[str]):
+        """Вероятности класса «реклама» для батча текстов (numpy-массив)."""
+        return self.pipeline.predict_proba(list(texts))[:, 1]
+
+    def decide_many(self, texts: Sequence[str]) -> List[Tuple[Optional[bool], Optional[float]]]:
+        """
+        Вердикты для батча текстов.
+
+        :return: [(True/False — уверенный вердикт, None — нужен GigaChat; вероятность)]
+        """
+        if not self.is_ready or not texts:
+            return [(None, None)] * len(texts)
+
+        probas = self.predict_proba_many(texts)
+        verdicts = []
+        for p in probas:
+            p = float(p)
+            if p >= self.threshold:
+                verdicts.append((True, p))
+            elif p <= 1 - self.threshold:
+                verdicts.append((False, p))
+            else:
+                verdicts.append((None, p))
+        return verdicts
+
+    def decide(self, text: str) -> Tuple[Optional[bool], Optional[float]]:
+        return self.decide_many([text])[0]
+
+
+# ====== Обучение и оценка ======
+async def load_training_data(with_incidents: bool = True) -> Tuple[List[str], List[int]]:
+    """
+    Размеченные тексты из БД: вердикты GigaChat (ad_checks) и,
+    опционально, тексты инцидентов как примеры рекламы.
+    """
+    from sqlalchemy import select
+    from app.db.database import SessionLocal
+    from app.db.models import AdCheck, Incident, Publication
+
+    labels: Dict[str, int] = {}
+    async with SessionLocal() as session:
+        if with_incidents:
+            published = select(Publication.text).where(
+                select(Incident.id).where(Incident.publication_id == Publication.id).exists()
+            )
+            for (text,) in await session.execute(published):
+                if text:
+                    labels[text] = 1
+        # Вердикты GigaChat приоритетнее, чем косвенная разметка через инциденты
+        for text, is_ad in await session.execute(select(AdCheck.text, AdCheck.is_ad)):
+            if text:
+                labels[text] = int(bool(is_ad))
+
+    texts = list(labels)
+    return texts, [labels[t] for t in texts]
+
+
+def evaluate(classifier: AdClassifier, texts: List[str], labels: List[int]) -> Dict[str, Any]:
+    """Качество модели и доля текстов, решаемых без GigaChat."""
+    from sklearn.metrics import f1_score, precision_score, recall_score, roc_auc_score
+
+    probas = classifier.predict_proba_many(texts)
+    predicted = [int(p >= 0.5) for p in probas]
+    decided = [(int(v), y) for (v, _), y in zip(classifier.decide_many(texts), labels) if v is not None]
+
+    metrics = {
+        'samples': len(texts),
+        'precision': precision_score(labels, predicted, zero_division=0),
+        'recall': recall_score(labels, predicted, zero_division=0),
+        'f1': f1_score(labels, predicted, zero_division=0),
+        'coverage': len(decided) / len(texts) if texts else 0.0,
+        'confident_accuracy': sum(v == y for v, y in decided) / len(decided) if decided else 0.0,
+    }
+    if len(set(labels)) > 1:
+        metrics['roc_auc'] = roc_auc_score(labels, probas)
+    return metrics
+
+
+def train(texts: List[str], labels: List[int], test_size: float = 0.2,
+          threshold: float = AD_CLASSIFIER_THRESHOLD) -> AdClassifier:
+    """Обучает модель, оценивает на отложенной выборке и дообучает на всех данных."""
+    from sklearn.model_selection import train_test_split
+
+    if len(set(labels)) < 2:
+        raise ValueError("Для обучения нужны примеры обоих классов (реклама и не реклама)")
+
+    x_train, x_test, y_train, y_test = train_test_split(
+        texts, labels, test_size=test_size, stratify=labels, random_state=42
+    )
+    holdout = AdClassifier(build_pipeline().fit(x_train, y_train), threshold)
+    metrics = evaluate(holdout, x_test, y_test)
+
+    return AdClassifier(build_pipeline().fit(texts, labels), threshold, metrics)
+
+
+def _print_metrics(metrics: Dict[str, Any]):
+    for key, value in metrics.items():
+        print(f"  {key}: {value:.3f}" if isinstance(value, float) else f"  {key}: {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный классификатор рекламы")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_train = sub.add_parser("train", help="обучить модель на данных из БД")
+    p_train.add_argument("--out", default=AD_CLASSIFIER_PATH)
+    p_train.add_argument("--test-size", type=float, default=0.2)
+    p_train.add_argument("--min-samples", type=int, default=50)
+    p_train.add_argument("--no-incidents", action="store_true", help="не использовать тексты инцидентов")
+
+    p_eval = sub.add_parser("evaluate", help="оценить сохраненную модель на данных из БД")
+    p_eval.add_argument("--model", default=AD_CLASSIFIER_PATH)
+    p_eval.add_argument("--no-incidents", action="store_true")
+
+    args = parser.parse_args()
+    texts, labels = asyncio.run(load_training_data(with_incidents=not args.no_incidents))
+    print(f"Размеченных текстов: {len(texts)} (реклама: {sum(labels)}, не реклама: {len(labels) - sum(labels)})")
+
+    if args.command == "train":
+        if len(texts) < args.min_samples:
+            raise SystemExit(f"Недостаточно данных: {len(texts)} < {args.min_samples}")
+        classifier = train(texts, labels, test_size=args.test_size)
+        print("Качество на отложенной выборке:")
+        _print_metrics(classifier.metrics)
+        classifier.save(args.out)
+        print(f"✅ Модель сохранена: {args.out}")
+    else:
+        classifier = AdClassifier.load(args.model)
+        if not classifier.is_ready:
+            raise SystemExit("Модель не загружена")
+        _print_metrics(evaluate(classifier, texts, labels))
+
+
+if __name__ == "__main__":
+    main()
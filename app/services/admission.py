@@ -0,0 +1,167 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Optional, Tuple
+
+# Запросов, выполняющихся одновременно
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "16"))
+# Запросов, ожидающих свободного места
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+# Запросов одного клиента (выполняющихся и ожидающих)
+ADMISSION_PER_CLIENT = int(os.getenv("ADMISSION_PER_CLIENT", "4"))
+# Задержка в очереди, после которой этапы GigaChat пропускаются (только правила), секунды
+ADMISSION_DEGRADE_DELAY = float(os.getenv("ADMISSION_DEGRADE_DELAY", "2"))
+# Задержка в очереди, после которой новые запросы отклоняются с 429, секунды
+ADMISSION_REJECT_DELAY = float(os.getenv("ADMISSION_REJECT_DELAY", "10"))
+# Коэффициент сглаживания средней задержки
+ADMISSION_DELAY_ALPHA = 0.2
+
+
+class Overloaded(Exception):
+    """Запрос отклонен контролем допуска."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass
+class Ticket:
+    """Допуск запроса: сколько он ждал и нужно ли пропустить этапы GigaChat."""
+    client_id: str
+    wait: float
+    degraded: bool
+    _controller: Optional["AdmissionController"] = field(default=None, repr=False)
+
+    def release(self):
+        """Освобождает место; повторный вызов ничего не делает."""
+        controller, self._controller = self._controller, None
+        if controller is not None:
+            controller._release(self.client_id)
+
+
+class AdmissionController:
+    """
+    Контроль допуска запросов к анализу.
+
+    Ограничивает число одновременно выполняемых запросов, длину очереди
+    и число запросов одного клиента. По задержке в очереди (сглаженной и
+    возрасту самого старого ожидающего) запросы сначала деградируют до
+    результатов только по правилам, а затем быстро отклоняются с 429.
+    """
+
+    def __init__(self, max_concurrency: int = ADMISSION_MAX_CONCURRENCY,
+                 max_queue: int = ADMISSION_MAX_QUEUE,
+                 per_client: int = ADMISSION_PER_CLIENT,
+                 degrade_delay: float = ADMISSION_DEGRADE_DELAY,
+                 reject_delay: float = ADMISSION_REJECT_DELAY):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.per_client = per_client
+        self.degrade_delay = degrade_delay
+        self.reject_delay = reject_delay
+
+        self._active = 0
+        # Очередь ожидающих: (время постановки, future, получающий место)
+        self._waiters: Deque[Tuple[float, asyncio.Future]] = deque()
+        self._clients: Dict[str, int] = {}
+        self._delay = 0.0
+
+    # ====== Состояние ======
+    @property
+    def queue_delay(self) -> float:
+        """Оценка задержки в очереди: сглаженная задержка или возраст самого старого ожидающего."""
+        oldest = time.monotonic() - self._waiters[0][0] if self._waiters else 0.0
+        return max(self._delay, oldest)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "active": self._active,
+            "queued": len(self._waiters),
+            "clients": len(self._clients),
+            "queue_delay": round(self.queue_delay, 3),
+        }
+
+    def _retry_after(self) -> int:
+        return max(1, math.ceil(self.queue_delay))
+
+    # ====== Допуск ======
+    async def acquire(self, client_id: str) -> Ticket:
+        """
+        Ждет свободного места для запроса.
+
+        :raises Overloaded: превышен лимит клиента, очередь заполнена или задержка слишком велика
+        """
+        if self._clients.get(client_id, 0) >= self.per_client:
+            raise Overloaded("Слишком много одновременных запросов от клиента", 1)
+
+        queued = not (self._active < self.max_concurrency and not self._waiters)
+        if queued:
+            if len(self._waiters) >= self.max_queue:
+                raise Overloaded("Очередь анализа заполнена", self._retry_after())
+            if self.queue_delay >= self.reject_delay:
+                raise Overloaded("Слишком большая задержка очереди анализа", self._retry_after())
+
+        self._clients[client_id] = self._clients.get(client_id, 0) + 1
+        start = time.monotonic()
+        try:
+            if queued:
+                future = asyncio.get_running_loop().create_future()
+                entry = (start, future)
+                self._waiters.append(entry)
+                try:
+                    # Место передается ожидающему в _release
+                    await asyncio.wait_for(asyncio.shield(future), timeout=self.reject_delay)
+                except BaseException:
+                    if future.done() and not future.cancelled():
+                        # Место уже передано — возвращаем его следующему
+                        self._active -= 1
+                        self._wake_next()
+                    else:
+                        future.cancel()
+                        self._waiters.remove(entry)
+                    raise
+            else:
+                self._active += 1
+        except asyncio.TimeoutError:
+            self._forget_client(client_id)
+            self._observe(time.monotonic() - start)
+            raise Overloaded("Превышено время ожидания в очереди анализа", self._retry_after())
+        except BaseException:
+            self._forget_client(client_id)
+            raise
+
+        wait = time.monotonic() - start
+        self._observe(wait)
+        degraded = max(wait, self._delay) >= self.degrade_delay
+        return Ticket(client_id, wait, degraded, self)
+
+    # ====== Внутреннее ======
+    def _observe(self, wait: float):
+        self._delay += ADMISSION_DELAY_ALPHA * (wait - self._delay)
+
+    def _release(self, client_id: str):
+        self._forget_client(client_id)
+        self._active -= 1
+        self._wake_next()
+        if not self._waiters and not self._active:
+            # Очередь пуста — прошлая задержка больше не показательна
+            self._delay = 0.0
+
+    def _wake_next(self):
+        while self._waiters and self._active < self.max_concurrency:
+            _, future = self._waiters.popleft()
+            if not future.done():
+                self._active += 1
+                future.set_result(None)
+
+    def _forget_client(self, client_id: str):
+        count = self._clients.get(client_id, 0) - 1
+        if count > 0:
+            self._clients[client_id] = count
+        else:
+            self._clients.pop(client_id, None)
@@ -1,7 +1,21 @@
+import asyncio
+import hashlib
+import json
 import os
-from openai import AsyncOpenAI
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
 from dotenv import load_dotenv
 
+from app.services.single_flight import SingleFlight
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
 load_dotenv()
 
 # === Константы ===
@@ -9,35 +23,522 @@ GIGACHAT_API_KEY = os.getenv("GIGACHAT_API_KEY")
 GIGACHAT_BASE_URL = "https://foundation-models.api.cloud.ru/v1"
 GIGACHAT_MODEL = "GigaChat/GigaChat-2-Max-without-filter"
 
+# === Пул соединений и лимиты ===
+GIGACHAT_MAX_CONNECTIONS = int(os.getenv("GIGACHAT_MAX_CONNECTIONS", "20"))
+GIGACHAT_MAX_KEEPALIVE = int(os.getenv("GIGACHAT_MAX_KEEPALIVE", "10"))
+GIGACHAT_KEEPALIVE_EXPIRY = float(os.getenv("GIGACHAT_KEEPALIVE_EXPIRY", "60"))
+GIGACHAT_CONNECT_TIMEOUT = float(os.getenv("GIGACHAT_CONNECT_TIMEOUT", "5"))
+GIGACHAT_MAX_RETRIES = int(os.getenv("GIGACHAT_MAX_RETRIES", "1"))
+# Одновременных запросов к GigaChat на процесс
+GIGACHAT_MAX_CONCURRENCY = int(os.getenv("GIGACHAT_MAX_CONCURRENCY", "8"))
+# Сколько запрос может ждать свободного слота
+GIGACHAT_QUEUE_TIMEOUT = float(os.getenv("GIGACHAT_QUEUE_TIMEOUT", "10"))
+# Бюджеты времени на один вызов
+GIGACHAT_ADS_TIMEOUT = float(os.getenv("GIGACHAT_ADS_TIMEOUT", "20"))
+GIGACHAT_RECOMMENDATION_TIMEOUT = float(os.getenv("GIGACHAT_RECOMMENDATION_TIMEOUT", "90"))
+
+# === Кэш ответов ===
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "2048"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+# Путь к SQLite-файлу кэша; пусто — только кэш в памяти процесса
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "")
+# Версии шаблонов промптов: при изменении текста промпта версию нужно поднять
+ADS_PROMPT_VERSION = "ads-v1"
+RECOMMENDATION_PROMPT_VERSION = "recommendation-v1"
+
+# === Микробатчинг find_ads ===
+# Сколько текстов объединять в один запрос (1 — без батчинга)
+GIGACHAT_ADS_BATCH_SIZE = int(os.getenv("GIGACHAT_ADS_BATCH_SIZE", "8"))
+# Сколько ждать остальных текстов после первого, секунды
+GIGACHAT_ADS_BATCH_DELAY = float(os.getenv("GIGACHAT_ADS_BATCH_DELAY", "0.05"))
+# Суммарная длина текстов в одном запросе
+GIGACHAT_ADS_BATCH_MAX_CHARS = int(os.getenv("GIGACHAT_ADS_BATCH_MAX_CHARS", "12000"))
+
+# Клиент уровня приложения: создается при старте, закрывается при остановке
+_client: "AsyncOpenAI | None" = None
+# Ключ не задан: клиент не пересоздается при каждом вызове, предупреждение печатается один раз
+_api_key_missing = False
+_semaphore: Optional[asyncio.Semaphore] = None
 
-def get_async_gigachat_client() -> AsyncOpenAI | None:
+
+def parse_ad_verdict(answer: Optional[str]) -> Optional[bool]:
     """
-    Создает и возвращает асинхронный клиент OpenAI для работы с GigaChat API.
+    Разбирает ответ find_ads: True — «Реклама», False — «Не реклама»,
+    None — ответ не распознан (ошибка, пустой ответ и т.п.).
     """
+    if not answer:
+        return None
+    normalized = re.sub(r'[^\w\s]', '', answer).strip().lower()
+    if normalized.startswith("не реклама"):
+        return False
+    if normalized.startswith("реклама"):
+        return True
+    return None
+
+
+def _create_client() -> "AsyncOpenAI | None":
+    """Создает клиент OpenAI с общим пулом HTTP-соединений и keep-alive."""
+    global _api_key_missing
     if not GIGACHAT_API_KEY:
-        print("❌ Не найден GIGACHAT_API_KEY в окружении")
+        if not _api_key_missing:
+            print("❌ Не найден GIGACHAT_API_KEY в окружении")
+            _api_key_missing = True
         return None
 
     try:
-        client = AsyncOpenAI(
+        # SDK импортируется при первом обращении к GigaChat, а не при старте API
+        import httpx
+        from openai import AsyncOpenAI
+
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=GIGACHAT_MAX_CONNECTIONS,
+                max_keepalive_connections=GIGACHAT_MAX_KEEPALIVE,
+                keepalive_expiry=GIGACHAT_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(GIGACHAT_RECOMMENDATION_TIMEOUT, connect=GIGACHAT_CONNECT_TIMEOUT),
+        )
+        return AsyncOpenAI(
             api_key=GIGACHAT_API_KEY,
-            base_url=GIGACHAT_BASE_URL
+            base_url=GIGACHAT_BASE_URL,
+            http_client=http_client,
+            max_retries=GIGACHAT_MAX_RETRIES,
         )
-        return client
     except Exception as e:
         print(f"⚠️ Ошибка создания клиента GigaChat: {e}")
         return None
 
 
-async def generate_recommendation(text: str, incidents: list) -> str:
+async def init_gigachat_client():
+    """Создает общий клиент GigaChat (вызывается при старте приложения)."""
+    global _client, _semaphore
+    if _client is None and not _api_key_missing:
+        _client = _create_client()
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(GIGACHAT_MAX_CONCURRENCY)
+
+
+async def close_gigachat_client():
+    """Закрывает общий клиент и его соединения (вызывается при остановке приложения)."""
+    global _client
+    # Накопленные батчи отправляются через общий клиент — он закрывается после них
+    if _ad_batcher is not None:
+        await _ad_batcher.drain()
+    if _client is not None:
+        await _client.close()
+        _client = None
+    if _cache is not None:
+        _cache.close()
+
+
+def get_async_gigachat_client() -> "AsyncOpenAI | None":
     """
-    Отправляет текст и список нарушений в GigaChat и получает рекомендации.
-    Использует асинхронный OpenAI-совместимый клиент.
+    Возвращает общий асинхронный клиент OpenAI для работы с GigaChat API.
+    Если приложение не вызвало init_gigachat_client (например, в скриптах), клиент создается при первом обращении.
     """
+    global _client
+    if _client is None and not _api_key_missing:
+        _client = _create_client()
+    return _client
+
+
+@asynccontextmanager
+async def _llm_slot():
+    """Ограничивает число одновременных запросов к GigaChat."""
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(GIGACHAT_MAX_CONCURRENCY)
+    await asyncio.wait_for(_semaphore.acquire(), timeout=GIGACHAT_QUEUE_TIMEOUT)
+    try:
+        yield
+    finally:
+        _semaphore.release()
+
+
+# ====== Кэш ответов ======
+class LLMCache:
+    """
+    Кэш ответов GigaChat: LRU с TTL в памяти процесса и опциональный SQLite,
+    переживающий перезапуск. Одновременные одинаковые запросы объединяются:
+    в GigaChat уходит один вызов, остальные ждут его результат.
+    """
+
+    def __init__(self, max_size: int = LLM_CACHE_SIZE, ttl: float = LLM_CACHE_TTL, path: str = LLM_CACHE_PATH):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._flights: SingleFlight[str, str] = SingleFlight()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+
+    # --- память процесса ---
+    def _get_local(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _put_local(self, key: str, value: str, expires_at: float):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    # --- SQLite (выполняется в потоке) ---
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),))
+            self._db.commit()
+        return self._db
+
+    def _db_get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._db_lock:
+            row = self._connect().execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ? AND expires_at >= ?", (key, time.time())
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def _db_put(self, key: str, value: str, expires_at: float):
+        with self._db_lock:
+            db = self._connect()
+            db.execute("INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                       (key, value, expires_at))
+            db.commit()
+
+    # --- публичный интерфейс ---
+    async def get(self, key: str) -> Optional[str]:
+        value = self._get_local(key)
+        if value is not None or not self.path:
+            return value
+        try:
+            row = await asyncio.to_thread(self._db_get, key)
+        except Exception as e:
+            print(f"⚠️ Ошибка чтения кэша GigaChat: {e}")
+            return None
+        if row is None:
+            return None
+        self._put_local(key, *row)
+        return row[0]
+
+    async def set(self, key: str, value: str):
+        expires_at = time.time() + self.ttl
+        self._put_local(key, value, expires_at)
+        if self.path:
+            try:
+                await asyncio.to_thread(self._db_put, key, value, expires_at)
+            except Exception as e:
+                print(f"⚠️ Ошибка записи кэша GigaChat: {e}")
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[str]],
+                             cacheable: Callable[[str], bool] = lambda value: True) -> str:
+        """Возвращает значение из кэша или вычисляет его один раз для всех одновременных запросов."""
+        if not self._flights.running(key):
+            value = await self.get(key)
+            if value is not None:
+                return value
+
+        async def compute_and_store() -> str:
+            value = await compute()
+            if cacheable(value):
+                await self.set(key, value)
+            return value
+
+        return await self._flights.run(key, compute_and_store)
+
+    def close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+_cache: Optional[LLMCache] = None
+
+
+def get_llm_cache() -> LLMCache:
+    global _cache
+    if _cache is None:
+        _cache = LLMCache()
+    return _cache
+
+
+def normalize_for_cache(text: str) -> str:
+    """Нормализация текста для ключа кэша: регистр и пробельные символы не важны."""
+    return re.sub(r'\s+', ' ', text.strip()).casefold()
+
+
+def text_cache_hash(text: str) -> str:
+    """Хеш нормализованного текста — часть ключа кэша, общая для всех видов запросов."""
+    return hashlib.sha256(normalize_for_cache(text).encode('utf-8')).hexdigest()
+
+
+def cache_key(kind: str, prompt_version: str, text: str, rule_ids: Tuple[str, ...] = (),
+              text_hash: Optional[str] = None) -> str:
+    """
+    Ключ кэша: хеш нормализованного текста, версия промпта, модель и отсортированные ID правил.
+    :param text_hash: хеш другого текста (почти дубликата), ответы для которого нужно переиспользовать
+    """
+    text_hash = text_hash or text_cache_hash(text)
+    parts = [kind, prompt_version, GIGACHAT_MODEL, text_hash, ','.join(sorted(rule_ids))]
+    return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+def _is_error_answer(answer: Optional[str]) -> bool:
+    return not answer or answer.startswith("⚠️") or answer.startswith("API GigaChat не настроен")
+
+
+async def generate_recommendation(text: str, incidents: list, text_hash: Optional[str] = None) -> str:
+    """
+    Возвращает рекомендации GigaChat по нарушениям (с кэшированием).
+    :param text_hash: хеш почти дубликата, чьи рекомендации переиспользуются (см. text_cache_hash)
+    """
+    if not LLM_CACHE_ENABLED:
+        return await _generate_recommendation_uncached(text, incidents)
+
+    return await get_llm_cache().get_or_compute(
+        _recommendation_cache_key(text, incidents, text_hash),
+        lambda: _generate_recommendation_uncached(text, incidents),
+        cacheable=lambda answer: not _is_error_answer(answer),
+    )
+
+
+async def stream_recommendation(text: str, incidents: list, text_hash: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Рекомендации GigaChat по нарушениям, отдаваемые фрагментами по мере генерации.
+    Ответ из кэша отдается одним фрагментом; полный ответ сохраняется в кэш.
+    """
+    key = None
+    if LLM_CACHE_ENABLED:
+        key = _recommendation_cache_key(text, incidents, text_hash)
+        cached = await get_llm_cache().get(key)
+        if cached is not None:
+            yield cached
+            return
+
     client = get_async_gigachat_client()
     if not client:
-        return "API GigaChat не настроен или клиент не создан."
+        yield "API GigaChat не настроен или клиент не создан."
+        return
+
+    parts = []
+    try:
+        async with _llm_slot():
+            stream = await client.chat.completions.create(
+                model=GIGACHAT_MODEL,
+                messages=_recommendation_messages(text, incidents),
+                max_tokens=5000,
+                temperature=0.7,
+                top_p=0.95,
+                presence_penalty=0,
+                timeout=GIGACHAT_RECOMMENDATION_TIMEOUT,
+                stream=True,
+            )
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    yield delta
+    except asyncio.TimeoutError:
+        yield "⚠️ Ошибка GigaChat: превышено время ожидания свободного слота"
+        return
+    except Exception as e:
+        # Часть ответа могла быть уже отдана — ошибка идет отдельным абзацем
+        yield f"\n\n⚠️ Ошибка GigaChat: {e}" if parts else f"⚠️ Ошибка GigaChat: {e}"
+        return
 
+    answer = ''.join(parts)
+    print(answer)
+    if key is not None and not _is_error_answer(answer):
+        await get_llm_cache().set(key, answer)
+
+
+async def find_ads(text: str, text_hash: Optional[str] = None) -> str:
+    """
+    Определяет через GigaChat, является ли текст рекламой (с кэшированием).
+    :param text_hash: хеш почти дубликата, чей вердикт переиспользуется (см. text_cache_hash)
+    """
+    if not LLM_CACHE_ENABLED:
+        return await get_ad_batcher().submit(text)
+
+    key = cache_key("ads", ADS_PROMPT_VERSION, text, text_hash=text_hash)
+    return await get_llm_cache().get_or_compute(
+        key,
+        lambda: get_ad_batcher().submit(text),
+        cacheable=lambda answer: parse_ad_verdict(answer) is not None,
+    )
+
+
+# ====== Микробатчинг проверки рекламы ======
+class AdBatcher:
+    """
+    Собирает тексты одновременных запросов find_ads за короткое окно
+    и отправляет их в GigaChat одним запросом с несколькими публикациями.
+    Если пакетный ответ не удалось разобрать, тексты проверяются по одному.
+    """
+
+    def __init__(self, max_size: int = GIGACHAT_ADS_BATCH_SIZE, max_delay: float = GIGACHAT_ADS_BATCH_DELAY,
+                 max_chars: int = GIGACHAT_ADS_BATCH_MAX_CHARS):
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.max_chars = max_chars
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._pending_chars = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, text: str) -> str:
+        """Ставит текст в текущий батч и ждет вердикт."""
+        if self.max_size <= 1:
+            return await _find_ads_uncached(text)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        self._pending_chars += len(text)
+
+        if len(self._pending) >= self.max_size or self._pending_chars >= self.max_chars:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush)
+
+        # Отмена одного ожидающего не отменяет запрос для остальных текстов батча
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._pending_chars = self._pending, [], 0
+        if not batch:
+            return
+
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]):
+        texts = [text for text, _ in batch]
+        try:
+            if len(texts) == 1:
+                results = [await _find_ads_uncached(texts[0])]
+            else:
+                results = await _find_ads_batch_uncached(texts)
+                if results is None:
+                    print(f"⚠️ Не удалось разобрать пакетный ответ GigaChat, проверяем {len(texts)} текстов по одному")
+                    results = await asyncio.gather(*(_find_ads_uncached(t) for t in texts))
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    async def drain(self):
+        """Отправляет накопленные тексты и дожидается всех запросов (при остановке приложения)."""
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+_ad_batcher: Optional[AdBatcher] = None
+
+
+def get_ad_batcher() -> AdBatcher:
+    global _ad_batcher
+    if _ad_batcher is None:
+        _ad_batcher = AdBatcher()
+    return _ad_batcher
+
+
+def parse_batch_verdicts(answer: Optional[str], expected: int) -> Optional[List[str]]:
+    """
+    Разбирает ответ на пакетный промпт: JSON-массив вердиктов или строки «N: вердикт».
+    :return: Вердикты по порядку или None, если ответ не соответствует формату
+    """
+    if not answer:
+        return None
+
+    verdicts = None
+    start, end = answer.find('['), answer.rfind(']')
+    if start != -1 and end > start:
+        try:
+            parsed = json.loads(answer[start:end + 1])
+            if isinstance(parsed, list) and all(isinstance(v, str) for v in parsed):
+                verdicts = parsed
+        except ValueError:
+            verdicts = None
+
+    if verdicts is None:
+        numbered = {}
+        for number, verdict in re.findall(r'^\s*(\d+)\s*[:.)\-]\s*(.+?)\s*$', answer, flags=re.MULTILINE):
+            numbered[int(number)] = verdict
+        if sorted(numbered) == list(range(1, expected + 1)):
+            verdicts = [numbered[i] for i in range(1, expected + 1)]
+
+    if verdicts is None or len(verdicts) != expected:
+        return None
+    if any(parse_ad_verdict(v) is None for v in verdicts):
+        return None
+    return ["Не реклама" if parse_ad_verdict(v) is False else "Реклама" for v in verdicts]
+
+
+async def _find_ads_batch_uncached(texts: List[str]) -> Optional[List[str]]:
+    """
+    Проверяет несколько публикаций одним запросом к GigaChat.
+    :return: Вердикты по порядку; None — ответ не разобран (нужна проверка по одному)
+    """
+    client = get_async_gigachat_client()
+    if not client:
+        return ["API GigaChat не настроен или клиент не создан."] * len(texts)
+
+    publications = "\n\n".join(f"### {i}\n{text}" for i, text in enumerate(texts, start=1))
+    prompt = (
+        "Ты эксперт по рекламе в телеграмм. Для каждой публикации ниже определи, является ли она рекламой.\n"
+        f"Публикации пронумерованы от 1 до {len(texts)} и начинаются с маркера ### <номер>.\n\n"
+        f"{publications}\n\n"
+        f"В ответ верни только JSON-массив из {len(texts)} строк по порядку публикаций, "
+        'каждая строка — "Реклама" или "Не реклама". Без пояснений.'
+    )
+
+    try:
+        async with _llm_slot():
+            response = await client.chat.completions.create(
+                model=GIGACHAT_MODEL,
+                messages=[
+                    {"role": "system", "content": "Ты эксперт по рекламе в телеграмм."},
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=50 + 10 * len(texts),
+                temperature=0,
+                top_p=0.95,
+                presence_penalty=0,
+                timeout=GIGACHAT_ADS_TIMEOUT,
+            )
+    except asyncio.TimeoutError:
+        return ["⚠️ Ошибка GigaChat: превышено время ожидания свободного слота"] * len(texts)
+    except Exception as e:
+        return [f"⚠️ Ошибка GigaChat: {e}"] * len(texts)
+
+    answer = response.choices[0].message.content
+    print(answer)
+    return parse_batch_verdicts(answer, len(texts))
+
+
+def _recommendation_messages(text: str, incidents: list) -> List[Dict[str, str]]:
     prompt = (
         "Ты эксперт по рекламе. Дай рекомендации, как исправить следующие нарушения:\n"
         f"{', '.join(i['rule_name'] for i in incidents)}\n\n"
@@ -46,29 +547,50 @@ async def generate_recommendation(text: str, incidents: list) -> str:
         "Только кратко, это будет выводиться пользователю бота в тг."
         "Формат вывода с эмодзи для пунктов списка и без специальных символов форматирования"
     )
+    return [
+        {"role": "system", "content": "Ты эксперт по рекламе и комплаенсу."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def _recommendation_cache_key(text: str, incidents: list, text_hash: Optional[str] = None) -> str:
+    rule_ids = tuple(str(i.get('rule_id', '')) for i in incidents)
+    return cache_key("recommendation", RECOMMENDATION_PROMPT_VERSION, text, rule_ids, text_hash)
+
+
+async def _generate_recommendation_uncached(text: str, incidents: list) -> str:
+    """
+    Отправляет текст и список нарушений в GigaChat и получает рекомендации.
+    Использует асинхронный OpenAI-совместимый клиент.
+    """
+    client = get_async_gigachat_client()
+    if not client:
+        return "API GigaChat не настроен или клиент не создан."
 
     try:
-        response = await client.chat.completions.create(
-            model=GIGACHAT_MODEL,
-            messages=[
-                {"role": "system", "content": "Ты эксперт по рекламе и комплаенсу."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=5000,
-            temperature=0.7,
-            top_p=0.95,
-            presence_penalty=0,
-        )
+        async with _llm_slot():
+            response = await client.chat.completions.create(
+                model=GIGACHAT_MODEL,
+                messages=_recommendation_messages(text, incidents),
+                max_tokens=5000,
+                temperature=0.7,
+                top_p=0.95,
+                presence_penalty=0,
+                timeout=GIGACHAT_RECOMMENDATION_TIMEOUT,
+            )
 
         print(response.choices[0].message.content)
 
         return response.choices[0].message.content
+    except asyncio.TimeoutError:
+        return "⚠️ Ошибка GigaChat: превышено время ожидания свободного слота"
     except Exception as e:
         return f"⚠️ Ошибка GigaChat: {e}"
 
-async def find_ads(text: str) -> str:
+
+async def _find_ads_uncached(text: str) -> str:
     """
-    Отправляет текст и список нарушений в GigaChat и получает рекомендации.
+    Отправляет текст в GigaChat и получает вердикт «Реклама / Не реклама».
     Использует асинхронный OpenAI-совместимый клиент.
     """
     client = get_async_gigachat_client()
@@ -82,20 +604,24 @@ async def find_ads(text: str) -> str:
     )
 
     try:
-        response = await client.chat.completions.create(
-            model=GIGACHAT_MODEL,
-            messages=[
-                {"role": "system", "content": "Ты эксперт по рекламе в телеграмм."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=2000,
-            temperature=0.7,
-            top_p=0.95,
-            presence_penalty=0,
-        )
+        async with _llm_slot():
+            response = await client.chat.completions.create(
+                model=GIGACHAT_MODEL,
+                messages=[
+                    {"role": "system", "content": "Ты эксперт по рекламе в телеграмм."},
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=2000,
+                temperature=0.7,
+                top_p=0.95,
+                presence_penalty=0,
+                timeout=GIGACHAT_ADS_TIMEOUT,
+            )
 
         print(response.choices[0].message.content)
 
         return response.choices[0].message.content
+    except asyncio.TimeoutError:
+        return "⚠️ Ошибка GigaChat: превышено время ожидания свободного слота"
     except Exception as e:
         return f"⚠️ Ошибка GigaChat: {e}"
\ No newline at end of file
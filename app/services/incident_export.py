@@ -0,0 +1,419 @@
+"""
+Выгрузка нарушений из БД в XLSX, CSV или Parquet.
+
+Строки читаются курсором на стороне сервера пачками по EXPORT_BATCH_SIZE и сразу
+дописываются в файл (XLSX — write-only книга, Parquet — row group на пачку):
+память не зависит от числа строк. Пока пачка пишется в executor, из БД
+читается следующая.
+
+Из API выгрузка идет фоновой задачей (app/api/v1/exports.py), из командной строки:
+
+    python -m app.services.incident_export --format xlsx --out incidents.xlsx \\
+        --since 2026-09-01 --until 2026-10-01 --group-sheets
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import re
+import time
+import uuid
+from collections import Counter
+from contextlib import aclosing
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+
+from app.db.database import SessionLocal
+from app.db.models import Incident, Publication
+from app.db.repository import incident_conditions
+from app.services.report_service import add_sheet, column_letter
+
+# Строк в одной пачке чтения из БД и записи в файл
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+# Каталог файлов фоновых выгрузок
+EXPORT_DIR = os.getenv("EXPORT_DIR", "./data/exports")
+# Одновременных фоновых выгрузок; остальные ждут в очереди
+EXPORT_MAX_CONCURRENCY = int(os.getenv("EXPORT_MAX_CONCURRENCY", "2"))
+# Сколько хранить готовые выгрузки, секунды
+EXPORT_TTL = float(os.getenv("EXPORT_TTL", str(24 * 3600)))
+
+EXPORT_FORMATS = ('xlsx', 'csv', 'parquet')
+EXPORT_MEDIA_TYPES = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv; charset=utf-8',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+# Колонки выгрузки (поля Incident) и ширина в XLSX
+EXPORT_COLUMNS: Tuple[Tuple[str, int], ...] = (
+    ('id', 10),
+    ('created_at', 20),
+    ('publication_id', 14),
+    ('rule_id', 15),
+    ('rule_name', 35),
+    ('severity', 12),
+    ('category', 15),
+    ('signal', 25),
+    ('закон', 25),
+    ('статья', 8),
+    ('выдержка_описание', 60),
+    ('штраф', 40),
+)
+TEXT_COLUMN = ('text', 80)
+
+# Строк данных на листе XLSX (лимит Excel минус заголовок); дальше — следующий лист
+XLSX_MAX_ROWS = 1048575
+# Символы, недопустимые в XML ячейки XLSX
+_ILLEGAL_XLSX_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_EXPORT_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+def export_columns(include_text: bool) -> Tuple[Tuple[str, int], ...]:
+    return EXPORT_COLUMNS + (TEXT_COLUMN,) if include_text else EXPORT_COLUMNS
+
+
+def export_statement(filters: Dict[str, Any], include_text: bool = False):
+    """Запрос строк выгрузки в порядке (created_at, id) — по индексу ix_incidents_created_at_id."""
+    columns = [getattr(Incident, name) for name, _ in EXPORT_COLUMNS]
+    if include_text:
+        columns.append(Publication.text)
+    stmt = select(*columns).where(*incident_conditions(**filters)).order_by(Incident.created_at, Incident.id)
+    if include_text:
+        stmt = stmt.join(Publication, Publication.id == Incident.publication_id)
+    return stmt
+
+
+async def iter_incident_batches(filters: Dict[str, Any], include_text: bool = False,
+                                batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[List[tuple]]:
+    """Строки выгрузки пачками; курсор на стороне сервера, в памяти — не больше одной пачки."""
+    stmt = export_statement(filters, include_text).execution_options(yield_per=batch_size)
+    async with SessionLocal() as session:
+        result = await session.stream(stmt)
+        async for partition in result.partitions(batch_size):
+            yield [tuple(row) for row in partition]
+
+
+# ====== Форматы ======
+class CsvExportWriter:
+    def __init__(self, path: str, columns: Sequence[Tuple[str, int]]):
+        # UTF-8 с BOM — Excel открывает кириллицу без настройки
+        self._file = open(path, 'w', encoding='utf-8-sig', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow([name for name, _ in columns])
+
+    def write(self, rows: List[tuple]):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+class XlsxExportWriter:
+    """
+    Write-only книга: строки сразу уходят во временные файлы листов.
+    Листы по правилам и категориям строятся по счетчикам, накопленным при записи.
+    """
+
+    SHEET_TITLE = 'Нарушения'
+
+    def __init__(self, path: str, columns: Sequence[Tuple[str, int]], group_sheets: bool = False):
+        # openpyxl импортируется только при выгрузке, чтобы не замедлять старт API
+        from openpyxl import Workbook
+
+        self.path = path
+        self.headers = [name for name, _ in columns]
+        self.widths = [(column_letter(i), width) for i, (_, width) in enumerate(columns, start=1)]
+        self.workbook = Workbook(write_only=True)
+        self._sheet = None
+        self._sheet_rows = 0
+        self._sheets = 0
+        self._rule_index = self.headers.index('rule_id')
+        self._rule_name_index = self.headers.index('rule_name')
+        self._category_index = self.headers.index('category')
+        self._severity_index = self.headers.index('severity')
+        self._rule_names: Dict[str, str] = {}
+        self._by_rule: Optional[Counter] = Counter() if group_sheets else None
+        self._by_category: Optional[Counter] = Counter() if group_sheets else None
+
+    def _next_sheet(self):
+        self._sheets += 1
+        title = self.SHEET_TITLE if self._sheets == 1 else f"{self.SHEET_TITLE} {self._sheets}"
+        self._sheet = add_sheet(self.workbook, title, self.headers, self.widths)
+        self._sheet_rows = 0
+
+    def write(self, rows: List[tuple]):
+        for row in rows:
+            if self._sheet is None or self._sheet_rows >= XLSX_MAX_ROWS:
+                self._next_sheet()
+            self._sheet.append([
+                _ILLEGAL_XLSX_CHARS.sub('', value) if isinstance(value, str) else value for value in row
+            ])
+            self._sheet_rows += 1
+            if self._by_rule is not None:
+                rule_id = row[self._rule_index]
+                self._rule_names.setdefault(rule_id, row[self._rule_name_index])
+                self._by_rule[(rule_id, row[self._severity_index])] += 1
+                self._by_category[(row[self._category_index], row[self._severity_index])] += 1
+
+    def close(self):
+        if self._sheet is None:
+            self._next_sheet()
+        if self._by_rule is not None:
+            self._group_sheet('По правилам', ['rule_id', 'rule_name'], self._by_rule,
+                              lambda rule_id: [rule_id, self._rule_names.get(rule_id)], [15, 35])
+            self._group_sheet('По категориям', ['category'], self._by_category,
+                              lambda category: [category], [20])
+        self.workbook.save(self.path)
+
+    def _group_sheet(self, title: str, key_headers: List[str], counts: Counter,
+                     key_cells: Callable[[Any], List[Any]], key_widths: List[int]):
+        """Лист «ключ × уровень»: число нарушений по каждому уровню и всего."""
+        severities = sorted({severity for _, severity in counts}, key=str)
+        totals: Counter = Counter()
+        for (key, _), count in counts.items():
+            totals[key] += count
+        headers = key_headers + [str(s) for s in severities] + ['всего']
+        widths = key_widths + [12] * (len(severities) + 1)
+        sheet = add_sheet(self.workbook, title, headers,
+                          [(column_letter(i), w) for i, w in enumerate(widths, start=1)])
+        for key, total in totals.most_common():
+            sheet.append(key_cells(key) + [counts.get((key, s), 0) for s in severities] + [total])
+
+
+class ParquetExportWriter:
+    """Parquet (pyarrow): каждая пачка — отдельная row group."""
+
+    def __init__(self, path: str, columns: Sequence[Tuple[str, int]]):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Выгрузка в Parquet требует пакет pyarrow")
+
+        types = {'id': pa.int64(), 'publication_id': pa.int64(), 'created_at': pa.timestamp('us')}
+        self._pa = pa
+        self.schema = pa.schema([(name, types.get(name, pa.string())) for name, _ in columns])
+        self._writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+
+    def write(self, rows: List[tuple]):
+        if rows:
+            arrays = [self._pa.array(values, type=field.type)
+                      for values, field in zip(zip(*rows), self.schema)]
+            self._writer.write_table(self._pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def open_writer(path: str, fmt: str, include_text: bool = False, group_sheets: bool = False):
+    columns = export_columns(include_text)
+    if fmt == 'xlsx':
+        return XlsxExportWriter(path, columns, group_sheets)
+    if fmt == 'csv':
+        return CsvExportWriter(path, columns)
+    if fmt == 'parquet':
+        return ParquetExportWriter(path, columns)
+    raise ValueError(f"Неизвестный формат выгрузки: {fmt}")
+
+
+async def export_incidents(path: str, fmt: str = 'xlsx', filters: Optional[Dict[str, Any]] = None,
+                           include_text: bool = False, group_sheets: bool = False,
+                           progress: Optional[Callable[[int], Any]] = None) -> int:
+    """
+    Выгружает нарушения в файл.
+    :param filters: аргументы incident_conditions (rule_id, severity, category, since, until)
+    :param progress: вызывается с числом записанных строк после каждой пачки
+    :return: Число строк
+    """
+    loop = asyncio.get_running_loop()
+    writer = await loop.run_in_executor(None, partial(open_writer, path, fmt, include_text, group_sheets))
+    count = 0
+    pending: Optional[asyncio.Future] = None
+    try:
+        # aclosing: при ошибке записи или отмене курсор и соединение закрываются сразу, а не при сборке мусора
+        async with aclosing(iter_incident_batches(filters or {}, include_text)) as batches:
+            async for batch in batches:
+                # Предыдущая пачка дописывается, пока читалась эта: в памяти не больше двух пачек
+                if pending is not None:
+                    await pending
+                pending = loop.run_in_executor(None, writer.write, batch)
+                count += len(batch)
+                if progress is not None:
+                    await progress(count)
+        if pending is not None:
+            await pending
+            pending = None
+        await loop.run_in_executor(None, writer.close)
+    except BaseException:
+        if pending is not None:
+            await asyncio.gather(pending, return_exceptions=True)
+        raise
+    return count
+
+
+# ====== Фоновые выгрузки ======
+def is_export_id(value: str) -> bool:
+    return bool(_EXPORT_ID.match(value))
+
+
+class ExportJobs:
+    """
+    Фоновые выгрузки для API.
+    Состояние хранится JSON-файлом рядом с выгрузкой, поэтому статус и файл
+    доступны из любого воркера на этом сервере.
+    """
+
+    def __init__(self, export_dir: str = EXPORT_DIR, max_concurrency: int = EXPORT_MAX_CONCURRENCY,
+                 ttl: float = EXPORT_TTL):
+        self.export_dir = Path(export_dir)
+        self.ttl = ttl
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def file_path(self, export_id: str, fmt: str) -> Path:
+        return self.export_dir / f"{export_id}.{fmt}"
+
+    def _status_path(self, export_id: str) -> Path:
+        return self.export_dir / f"{export_id}.json"
+
+    def _write_status(self, export_id: str, status: Dict[str, Any]):
+        path = self._status_path(export_id)
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        tmp_path.write_text(json.dumps(status, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp_path, path)
+
+    def _read_status(self, export_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(self._status_path(export_id).read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            return None
+
+    def _prune(self):
+        """Удаляет выгрузки старше TTL."""
+        deadline = time.time() - self.ttl
+        for path in self.export_dir.iterdir():
+            try:
+                if path.stat().st_mtime < deadline:
+                    path.unlink()
+            except OSError:
+                pass
+
+    async def start(self, fmt: str, filters: Dict[str, Any], include_text: bool = False,
+                    group_sheets: bool = False) -> str:
+        """Ставит выгрузку в очередь и возвращает ее ID."""
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Неизвестный формат выгрузки: {fmt}")
+        if group_sheets and fmt != 'xlsx':
+            raise ValueError("Листы группировки доступны только в XLSX")
+
+        self.export_dir.mkdir(parents=True, exist_ok=True)
+        await asyncio.to_thread(self._prune)
+        export_id = uuid.uuid4().hex
+        status = {
+            "export_id": export_id,
+            "status": "queued",
+            "format": fmt,
+            "rows": 0,
+            "created_at": datetime.utcnow().isoformat(),
+        }
+        await asyncio.to_thread(self._write_status, export_id, status)
+        task = asyncio.get_running_loop().create_task(
+            self._run(export_id, status, filters, include_text, group_sheets)
+        )
+        self._tasks[export_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(export_id, None))
+        return export_id
+
+    async def status(self, export_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._read_status, export_id)
+
+    async def _run(self, export_id: str, status: Dict[str, Any], filters: Dict[str, Any],
+                   include_text: bool, group_sheets: bool):
+        fmt = status["format"]
+        path = self.file_path(export_id, fmt)
+        tmp_path = path.with_name(f"{path.name}.tmp")
+
+        async def progress(rows: int):
+            status["rows"] = rows
+            await asyncio.to_thread(self._write_status, export_id, status)
+
+        try:
+            async with self._semaphore:
+                status["status"] = "running"
+                await asyncio.to_thread(self._write_status, export_id, status)
+                started = time.monotonic()
+                rows = await export_incidents(str(tmp_path), fmt, filters, include_text, group_sheets, progress)
+                os.replace(tmp_path, path)
+            status.update(status="done", rows=rows, seconds=round(time.monotonic() - started, 1))
+            print(f"[Export] {export_id}: {rows} строк в {fmt} за {status['seconds']} с")
+        except asyncio.CancelledError:
+            status.update(status="failed", error="Выгрузка остановлена")
+            raise
+        except Exception as e:
+            print(f"[Export] Ошибка выгрузки {export_id}: {e}")
+            status.update(status="failed", error=str(e))
+        finally:
+            # Итоговый статус записывается, даже если задачу отменят повторно
+            await asyncio.shield(asyncio.to_thread(self._finish, export_id, status, tmp_path))
+
+    def _finish(self, export_id: str, status: Dict[str, Any], tmp_path: Path):
+        if tmp_path.exists():
+            tmp_path.unlink()
+        self._write_status(export_id, status)
+
+    async def close(self):
+        """Останавливает незавершенные выгрузки."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+_jobs: Optional[ExportJobs] = None
+
+
+def get_export_jobs() -> ExportJobs:
+    global _jobs
+    if _jobs is None:
+        _jobs = ExportJobs()
+    return _jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Выгрузка нарушений из БД")
+    parser.add_argument("--out", required=True, help="файл выгрузки")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, help="по умолчанию — по расширению --out")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="created_at >= since")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="created_at < until")
+    parser.add_argument("--rule-id")
+    parser.add_argument("--severity")
+    parser.add_argument("--category")
+    parser.add_argument("--include-text", action="store_true", help="добавить текст публикации")
+    parser.add_argument("--group-sheets", action="store_true", help="листы по правилам и категориям (XLSX)")
+
+    args = parser.parse_args()
+    fmt = args.format or Path(args.out).suffix.lstrip('.').lower()
+    if fmt not in EXPORT_FORMATS:
+        raise SystemExit(f"Неизвестный формат выгрузки: {fmt}")
+    if args.group_sheets and fmt != 'xlsx':
+        raise SystemExit("Листы группировки доступны только в XLSX")
+    filters = {"rule_id": args.rule_id, "severity": args.severity, "category": args.category,
+               "since": args.since, "until": args.until}
+
+    async def report_progress(rows: int):
+        print(f"\r  строк: {rows}", end="", flush=True)
+
+    started = time.monotonic()
+    rows = asyncio.run(export_incidents(args.out, fmt, filters, args.include_text, args.group_sheets,
+                                        report_progress))
+    print(f"\n✅ Выгружено {rows} строк в {args.out} за {time.monotonic() - started:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+from collections import deque
+from typing import Dict, FrozenSet, Iterable, List, Set, Tuple
+
+
+class PhraseMatcher:
+    """
+    Автомат Ахо–Корасик над набором фраз.
+
+    Все фразы правил компилируются в один автомат при загрузке,
+    после чего текст сканируется за один проход независимо от числа фраз.
+    """
+
+    def __init__(self, phrases: Iterable[str] = ()):
+        self.phrases: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+
+        for phrase in phrases:
+            self._add(phrase)
+        self._build()
+
+    def _add(self, phrase: str) -> int:
+        """Добавляет фразу в бор и возвращает её ID (повторная фраза получает прежний ID)."""
+        if phrase in self._ids:
+            return self._ids[phrase]
+
+        phrase_id = len(self.phrases)
+        self.phrases.append(phrase)
+        self._ids[phrase] = phrase_id
+
+        node = 0
+        for ch in phrase:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            node = nxt
+        self._out[node] = self._out[node] + (phrase_id,)
+        return phrase_id
+
+    def phrase_id(self, phrase: str) -> int:
+        """Возвращает ID ранее добавленной фразы."""
+        return self._ids[phrase]
+
+    def _build(self):
+        """Строит суффиксные ссылки обходом бора в ширину."""
+        queue = deque()
+        for child in self._goto[0].values():
+            self._fail[child] = 0
+            queue.append(child)
+
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                # Выходы суффиксной ссылки наследуются, чтобы не ходить по ним при поиске
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find_ids(self, text: str) -> FrozenSet[int]:
+        """Возвращает множество ID фраз, встречающихся в тексте (один проход)."""
+        goto, fail, out = self._goto, self._fail, self._out
+        found: Set[int] = set(out[0])
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found.update(out[node])
+        return frozenset(found)
+
+    def scan(self, text: str, state: int = 0) -> Tuple[List[Tuple[int, int]], int]:
+        """
+        Потоковый поиск: продолжает с состояния предыдущего фрагмента.
+
+        :return: ([(ID фразы, индекс последнего символа в text)], новое состояние)
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        matches: List[Tuple[int, int]] = []
+        node = state
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                matches.extend((phrase_id, i) for phrase_id in out[node])
+        return matches, node
@@ -0,0 +1,141 @@
+"""
+Поиск почти дубликатов публикаций (репосты с другими эмодзи, промокодом, пробелами).
+
+SimHash по шинглам слов предобработанного текста и LSH-индекс по полосам битов:
+при пороге в d отличающихся бит хеш делится на d + 1 полосу, и у почти
+дубликата хотя бы одна полоса совпадает целиком (принцип Дирихле). Поиск
+проверяет только кандидатов из совпавших корзин.
+"""
+import hashlib
+import os
+import re
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+NEAR_DUP_ENABLED = os.getenv("NEAR_DUP_ENABLED", "1") == "1"
+# Минимальное сходство SimHash (доля совпадающих бит из 64) для переиспользования результатов
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.95"))
+# Слов в шингле
+NEAR_DUP_SHINGLE_SIZE = int(os.getenv("NEAR_DUP_SHINGLE_SIZE", "2"))
+
+HASH_BITS = 64
+# Слова без цифр: промокоды, цены и даты в репостах меняются и в отпечаток не входят
+_WORD = re.compile(r'\b[^\W\d]+\b')
+
+
+def shingles(preprocessed_text: str, size: int = NEAR_DUP_SHINGLE_SIZE) -> List[str]:
+    """Шинглы из слов; эмодзи, пунктуация и слова с цифрами не учитываются."""
+    words = _WORD.findall(preprocessed_text.lower())
+    if len(words) <= size:
+        return [' '.join(words)] if words else []
+    return [' '.join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+def simhash(preprocessed_text: str, size: int = NEAR_DUP_SHINGLE_SIZE) -> Optional[int]:
+    """64-битный SimHash текста (результат NLPService.preprocess); None — в тексте нет слов."""
+    items = shingles(preprocessed_text, size)
+    if not items:
+        return None
+    # Биты хешей шинглов в виде строк: подсчет единиц по столбцам выполняется в C (zip + count)
+    bits = [
+        format(int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'big'), '064b')
+        for s in items
+    ]
+    half = len(bits) / 2
+    value = 0
+    for column in zip(*bits):
+        value = (value << 1) | (column.count('1') > half)
+    return value
+
+
+def to_signed(value: int) -> int:
+    """Беззнаковый 64-битный хеш в знаковый (для столбца BIGINT)."""
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def to_unsigned(value: int) -> int:
+    return value + (1 << HASH_BITS) if value < 0 else value
+
+
+def max_distance(threshold: float = NEAR_DUP_THRESHOLD) -> int:
+    """Сколько бит из 64 может отличаться при заданном пороге сходства."""
+    return max(0, int((1 - threshold) * HASH_BITS + 1e-9))
+
+
+class SimHashIndex:
+    """
+    LSH-индекс SimHash → ключ публикации.
+
+    Хеши и ключи хранятся в компактных массивах, корзины полос ссылаются
+    на позиции в них.
+    """
+
+    def __init__(self, threshold: float = NEAR_DUP_THRESHOLD):
+        self.threshold = threshold
+        self.max_distance = max_distance(threshold)
+        bands = self.max_distance + 1
+        # Полосы покрывают все 64 бита; размеры отличаются не больше чем на 1
+        widths = [HASH_BITS // bands + (1 if i < HASH_BITS % bands else 0) for i in range(bands)]
+        self._bands: List[Tuple[int, int]] = []
+        shift = 0
+        for width in widths:
+            self._bands.append((shift, (1 << width) - 1))
+            shift += width
+
+        self._hashes = array('Q')
+        self._keys: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._buckets: List[Dict[int, List[int]]] = [{} for _ in self._bands]
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def add(self, value: int, key: str):
+        """Добавляет хеш публикации; повторное добавление ключа ничего не делает."""
+        if key in self._positions:
+            return
+        position = len(self._hashes)
+        self._hashes.append(value)
+        self._keys.append(key)
+        self._positions[key] = position
+        for (shift, mask), buckets in zip(self._bands, self._buckets):
+            buckets.setdefault((value >> shift) & mask, []).append(position)
+
+    def query(self, value: int) -> Optional[Tuple[str, float]]:
+        """
+        Ближайшая публикация с сходством не ниже порога.
+        :return: (ключ, сходство) или None
+        """
+        best_position, best_distance = None, self.max_distance + 1
+        seen = set()
+        for (shift, mask), buckets in zip(self._bands, self._buckets):
+            for position in buckets.get((value >> shift) & mask, ()):
+                if position in seen:
+                    continue
+                seen.add(position)
+                distance = (self._hashes[position] ^ value).bit_count()
+                if distance < best_distance:
+                    best_position, best_distance = position, distance
+                    if distance == 0:
+                        break
+        if best_position is None:
+            return None
+        return self._keys[best_position], 1 - best_distance / HASH_BITS
+
+
+async def load_index(index: SimHashIndex, batch_size: int = 10000) -> int:
+    """Заполняет индекс отпечатками сохраненных публикаций (потоково, без загрузки таблицы в память)."""
+    from sqlalchemy import select
+    from app.db.database import SessionLocal
+    from app.db.models import Publication
+
+    stmt = (
+        select(Publication.simhash, Publication.text_key)
+        .where(Publication.simhash.isnot(None), Publication.text_key.isnot(None))
+        .execution_options(yield_per=batch_size)
+    )
+    async with SessionLocal() as session:
+        result = await session.stream(stmt)
+        async for value, text_key in result:
+            index.add(to_unsigned(value), text_key)
+    return len(index)
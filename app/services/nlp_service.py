@@ -1,17 +1,78 @@
+import os
 import re
+import threading
 import yaml
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
-from typing import Dict, Any, List
-from sklearn.feature_extraction.text import TfidfVectorizer
+from typing import Dict, Any, Iterable, List, Optional
+
+from app.services.rule_engine import CompiledRuleSet, TextContext
+from app.services.stream_analyzer import StreamingAnalysis
+
+
+# Батчи меньше этого размера анализируются в текущем процессе:
+# запуск задач в пуле процессов дороже самого анализа
+PARALLEL_BATCH_THRESHOLD = int(os.getenv("NLP_PARALLEL_BATCH_THRESHOLD", "256"))
+MAX_WORKERS = int(os.getenv("NLP_MAX_WORKERS", "0")) or os.cpu_count() or 1
+
+# Экземпляр сервиса внутри процесса пула
+_worker_service: Optional["NLPService"] = None
+
+
+def _init_worker(service: "NLPService"):
+    global _worker_service
+    _worker_service = service
+
+
+def _analyze_in_worker(text: str, ruleset: Optional[CompiledRuleSet]) -> Dict[str, Any]:
+    return _worker_service.analyze(text, ruleset)
 
 
 class NLPService:
-    def __init__(self, rules_config: str = None):
-        # Автоматический поиск файла правил
-        self.rules = self._find_and_load_rules(rules_config)
-        self.vectorizer = TfidfVectorizer(ngram_range=(1, 2), max_features=1000)
-        self._fit_vectorizer()
+    # Шаблоны сущностей (ключи совпадают с rule_engine.ENTITY_TYPES)
+    ENTITY_PATTERNS = {
+        'INN': re.compile(r'\b\d{10}\b|\b\d{12}\b'),
+        'phone': re.compile(r'\+?7[\s\-]?\(?[489][0-9]{2}\)?[\s\-]?[0-9]{3}[\s\-]?[0-9]{2}[\s\-]?[0-9]{2}'),
+        'email': re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'),
+        'links': re.compile(r'https?://[^\s]+|www\.[^\s]+|t\.me/[^\s]+|bit\.ly/[^\s]+'),
+    }
+    # Поля ПД: (шаблон, искать в тексте в нижнем регистре)
+    PD_PATTERNS = {
+        'phone': (re.compile(r"\+?\d[\d\s\-()]{6,}\d"), False),
+        'email': (re.compile(r"[\w\.\-]+@[\w\.\-]+"), False),
+        'name_prompt': (re.compile(r"\bимя\b|\bфамилия\b"), True),
+        'form_or_bot': (re.compile(r"\bвведите\b|\bотправьте\b|\bзаполните форму\b|\bбот для регистрации\b"), True),
+    }
+    # Явная реклама
+    AD_EXPLICIT_KEYWORDS = ('реклама', '#реклама', 'promo', 'ad', 'sponsored')
+    # Неявная реклама
+    AD_IMPLICIT_KEYWORDS = ('скидк', 'акци', 'промокод', 'промо', 'распродаж')
+
+    def __init__(self, rules_config: str = None, ruleset: Optional[CompiledRuleSet] = None):
+        if ruleset is not None:
+            # Уже скомпилированный набор (например, из RuleRegistry)
+            self.ruleset = ruleset
+            self.rules = [rule.raw for rule in ruleset.rules]
+        else:
+            # Автоматический поиск файла правил
+            self.rules = self._find_and_load_rules(rules_config)
+            self.ruleset = CompiledRuleSet(self.rules)
         self.severity_points = {'high': 5, 'medium': 2, 'low': 1}
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # analyze_many вызывается из потоков executor: пул создается один раз
+        self._pool_lock = threading.Lock()
+
+    def __getstate__(self):
+        # Пул процессов и блокировка не передаются в воркеры вместе с сервисом
+        state = self.__dict__.copy()
+        state['_pool'] = None
+        del state['_pool_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._pool_lock = threading.Lock()
 
     def _find_and_load_rules(self, rules_config: str = None) -> List[Dict]:
         """Находит и загружает файл правил."""
@@ -63,19 +124,6 @@ class NLPService:
         except Exception as e:
             print(f"[NLPService] Ошибка загрузки правил: {e}")
 
-    # Остальные методы остаются без изменений...
-    def _fit_vectorizer(self):
-        """Обучает векторизатор на ключевых словах из правил."""
-        all_keywords = []
-        for rule in self.rules:
-            condition = rule.get('condition', {})
-            all_keywords.extend(condition.get('contains', []))
-            all_keywords.extend(condition.get('not_contains', []))
-
-        sample_texts = list(set(all_keywords))
-        if sample_texts:
-            self.vectorizer.fit(sample_texts)
-
     def preprocess(self, text: str) -> str:
         """Удаление лишних пробелов и нормализация текста."""
         return re.sub(r'\s+', ' ', text.strip())
@@ -91,89 +139,50 @@ class NLPService:
 
     def _extract_inn(self, text: str) -> List[str]:
         """Находит ИНН (10 или 12 цифр)."""
-        inn_pattern = r'\b\d{10}\b|\b\d{12}\b'
-        return re.findall(inn_pattern, text)
+        return self.ENTITY_PATTERNS['INN'].findall(text)
 
     def _extract_phone(self, text: str) -> List[str]:
         """Извлекает телефоны из текста."""
-        phone_pattern = r'\+?7[\s\-]?\(?[489][0-9]{2}\)?[\s\-]?[0-9]{3}[\s\-]?[0-9]{2}[\s\-]?[0-9]{2}'
-        return re.findall(phone_pattern, text)
+        return self.ENTITY_PATTERNS['phone'].findall(text)
 
     def _extract_email(self, text: str) -> List[str]:
         """Извлекает email из текста."""
-        email_pattern = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
-        return re.findall(email_pattern, text)
+        return self.ENTITY_PATTERNS['email'].findall(text)
 
     def _extract_links(self, text: str) -> List[str]:
         """Извлекает ссылки из текста."""
-        link_pattern = r'https?://[^\s]+|www\.[^\s]+|t\.me/[^\s]+|bit\.ly/[^\s]+'
-        return re.findall(link_pattern, text)
-
-    def detect_personal_data_fields(self, text: str) -> Dict[str, bool]:
-        """Определяет наличие полей персональных данных."""
-        text_lower = text.lower()
+        return self.ENTITY_PATTERNS['links'].findall(text)
+
+    def detect_personal_data_fields(self, text: str, text_lower: Optional[str] = None) -> Dict[str, bool]:
+        """
+        Определяет наличие полей персональных данных.
+        :param text_lower: text.lower(), если уже посчитан (TextContext.lower)
+        """
+        if text_lower is None:
+            text_lower = text.lower()
         fields = {
-            'phone': bool(re.search(r"\+?\d[\d\s\-()]{6,}\d", text)),
-            'email': bool(re.search(r"[\w\.\-]+@[\w\.\-]+", text)),
-            'name_prompt': bool(re.search(r"\bимя\b|\bфамилия\b", text_lower)),
-            'form_or_bot': bool(
-                re.search(r"\bвведите\b|\bотправьте\b|\bзаполните форму\b|\bбот для регистрации\b", text_lower)),
+            name: bool(pattern.search(text_lower if on_lower else text))
+            for name, (pattern, on_lower) in self.PD_PATTERNS.items()
         }
         return fields
 
-    def _check_condition(self, text: str, condition: Dict) -> bool:
-        """Проверяет условие правила для текста."""
-        text_lower = text.lower()
-
-        # Проверка на наличие требуемых фраз
-        if 'contains' in condition:
-            contains_rules = condition['contains']
-            if isinstance(contains_rules, list):
-                if not any(phrase in text_lower for phrase in contains_rules):
-                    return False
-            elif isinstance(contains_rules, str) and contains_rules not in text_lower:
-                return False
-
-        # Проверка на отсутствие запрещенных фраз
-        if 'not_contains' in condition:
-            not_contains_rules = condition['not_contains']
-            if isinstance(not_contains_rules, list):
-                if any(phrase in text_lower for phrase in not_contains_rules):
-                    return False
-            elif isinstance(not_contains_rules, str) and not_contains_rules in text_lower:
-                return False
-
-        # Проверка регулярных выражений
-        if 'contains_pattern' in condition:
-            patterns = condition['contains_pattern']
-            if isinstance(patterns, list):
-                if not any(re.search(pattern, text) for pattern in patterns):
-                    return False
-            elif isinstance(patterns, str) and not re.search(patterns, text):
-                return False
-
-        # Проверка сущностей
-        if 'requires_entity' in condition:
-            entities = self.extract_entities(text)
-            required_entities = condition['requires_entity']
-            for entity_type in required_entities:
-                if not entities.get(entity_type.lower(), []):
-                    return False
-
-        return True
-
-    def classify_ad(self, text: str) -> Dict[str, Any]:
-        """Определяет, является ли текст рекламой."""
-        t = text.lower()
-
-        # Явная реклама
-        explicit_keywords = ['реклама', '#реклама', 'promo', 'ad', 'sponsored']
-        # Неявная реклама
-        implicit_keywords = ['скидк', 'акци', 'промокод', 'промо', 'распродаж']
-
-        is_explicit_ad = any(k in t for k in explicit_keywords)
-        is_implicit_ad = any(k in t for k in implicit_keywords)
+    def make_context(self, text: str) -> TextContext:
+        """Создает контекст текста с ленивым извлечением сущностей и полей ПД."""
+        return TextContext(text, self.extract_entities, self.detect_personal_data_fields)
 
+    def classify_ad(self, text: str, text_lower: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Определяет, является ли текст рекламой.
+        :param text_lower: text.lower(), если уже посчитан (TextContext.lower)
+        """
+        t = text_lower if text_lower is not None else text.lower()
+
+        is_explicit_ad = any(k in t for k in self.AD_EXPLICIT_KEYWORDS)
+        is_implicit_ad = any(k in t for k in self.AD_IMPLICIT_KEYWORDS)
+        return self._ad_info(is_explicit_ad, is_implicit_ad)
+
+    @staticmethod
+    def _ad_info(is_explicit_ad: bool, is_implicit_ad: bool) -> Dict[str, Any]:
         is_ad = is_explicit_ad or is_implicit_ad
         score = 0.9 if is_ad else 0.2
 
@@ -194,28 +203,22 @@ class NLPService:
             'risk_level': risk_level
         }
 
-    def analyze(self, text: str) -> Dict[str, Any]:
-        """Собирает все NLP-данные и применяет правила."""
+    def analyze(self, text: str, ruleset: Optional[CompiledRuleSet] = None) -> Dict[str, Any]:
+        """
+        Собирает все NLP-данные и применяет правила.
+
+        :param ruleset: набор правил для этого текста (по умолчанию — набор сервиса)
+        """
+        if ruleset is None:
+            ruleset = self.ruleset
         preprocessed_text = self.preprocess(text)
-        entities = self.extract_entities(preprocessed_text)
-        ad_info = self.classify_ad(preprocessed_text)
-        pd_fields = self.detect_personal_data_fields(preprocessed_text)
+        ctx = self.make_context(preprocessed_text)
+        entities = ctx.entities
+        ad_info = self.classify_ad(preprocessed_text, ctx.lower)
+        pd_fields = ctx.pd_fields
 
         # Применяем правила
-        violations = []
-        for rule in self.rules:
-            if self._check_condition(preprocessed_text, rule.get('condition', {})):
-                # Создаем violation с полной юридической информацией
-                violation = {
-                    'rule_id': rule['id'],
-                    'rule_name': rule['name'],
-                    'description': rule.get('description', ''),
-                    'signal': rule['signal'],
-                    'severity': rule.get('severity', 'medium'),
-                    'category': rule.get('category', 'general'),
-                    'law': rule.get('law', {})  # Юридическая информация из правил
-                }
-                violations.append(violation)
+        violations = ruleset.evaluate(ctx)
 
         # Расчет уровня риска
         risk_info = self._calculate_risk_level(violations)
@@ -227,5 +230,69 @@ class NLPService:
             'pd_fields': pd_fields,
             'violations': violations,
             'violation_count': len(violations),
+            'rules_version': ruleset.version,
             **risk_info
         }
+
+    def stream_analysis(self, ruleset: Optional[CompiledRuleSet] = None) -> StreamingAnalysis:
+        """Создает потоковый анализ: фрагменты подаются через feed(), результат — finish()."""
+        return StreamingAnalysis(self, ruleset if ruleset is not None else self.ruleset)
+
+    def analyze_stream(self, chunks: Iterable[str], ruleset: Optional[CompiledRuleSet] = None) -> Dict[str, Any]:
+        """
+        Анализирует длинный текст, поступающий фрагментами, в ограниченной памяти.
+
+        В отличие от analyze() не возвращает текст целиком; каждое нарушение
+        содержит spans — смещения совпадений в исходном тексте.
+        """
+        analysis = self.stream_analysis(ruleset)
+        for chunk in chunks:
+            analysis.feed(chunk)
+        return analysis.finish()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """Пул процессов создается при первом большом батче и переиспользуется."""
+        pool = self._pool
+        if pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=MAX_WORKERS,
+                        initializer=_init_worker,
+                        initargs=(self,)
+                    )
+                pool = self._pool
+        return pool
+
+    def analyze_many(self, texts: List[str], parallel: Optional[bool] = None,
+                     ruleset: Optional[CompiledRuleSet] = None) -> List[Dict[str, Any]]:
+        """
+        Анализирует список текстов, сохраняя порядок.
+
+        Большие батчи распределяются по пулу процессов, малые
+        обрабатываются в текущем процессе.
+
+        :param parallel: принудительно включить/выключить пул процессов
+        :param ruleset: набор правил для батча (по умолчанию — набор сервиса)
+        :return: Список результатов analyze() для каждого текста
+        """
+        if parallel is None:
+            parallel = len(texts) >= PARALLEL_BATCH_THRESHOLD
+
+        if not parallel or len(texts) < 2:
+            return [self.analyze(text, ruleset) for text in texts]
+
+        pool = self._get_pool()
+        chunksize = max(1, len(texts) // (4 * MAX_WORKERS))
+        # Набор правил сервиса уже есть в воркерах; другой набор передается
+        # вместе с каждым чанком и сериализуется один раз на чанк
+        if ruleset is self.ruleset:
+            ruleset = None
+        return list(pool.map(_analyze_in_worker, texts, repeat(ruleset), chunksize=chunksize))
+
+    def close(self):
+        """Останавливает пул процессов, если он был запущен."""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
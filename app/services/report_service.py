@@ -1,6 +1,130 @@
+import csv
 import io
-import pandas as pd
-from typing import List, Dict, Any
+import json
+from typing import Any, Dict, IO, Iterable, List, Sequence, Tuple
+
+# Шаблон отчета: заголовок колонки и ширина
+REPORT_COLUMNS: Tuple[Tuple[str, int], ...] = (
+    ('rule_id', 15),
+    ('rule_name', 35),
+    ('severity', 12),
+    ('category', 15),
+    ('signal', 25),
+    ('закон', 25),
+    ('статья', 8),
+    ('выдержка_описание', 60),
+    ('штраф', 40),
+)
+REPORT_HEADERS: Tuple[str, ...] = tuple(header for header, _ in REPORT_COLUMNS)
+REPORT_SHEET = 'Нарушения'
+REPORT_FORMATS = ('xlsx', 'csv', 'json')
+REPORT_MEDIA_TYPES = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv; charset=utf-8',
+    'json': 'application/json',
+}
+# Меняется вместе с колонками или оформлением: закэшированные файлы отчетов устаревают
+REPORT_TEMPLATE_VERSION = 'v1'
+
+
+def column_letter(index: int) -> str:
+    """Буква колонки Excel по номеру с 1 (1 → A, 27 → AA)."""
+    letters = ''
+    while index:
+        index, rest = divmod(index - 1, 26)
+        letters = chr(ord('A') + rest) + letters
+    return letters
+
+
+# Ширины колонок по буквам — считаются один раз, а не для каждого отчета
+REPORT_WIDTHS: Tuple[Tuple[str, int], ...] = tuple(
+    (column_letter(i), width) for i, (_, width) in enumerate(REPORT_COLUMNS, start=1)
+)
+
+
+def violation_row(violation: Dict[str, Any]) -> List[Any]:
+    """Строка отчета по нарушению в порядке REPORT_COLUMNS."""
+    law_info = violation.get('law') or {}
+    return [
+        violation.get('rule_id', ''),
+        violation.get('rule_name', ''),
+        violation.get('severity', ''),
+        violation.get('category', ''),
+        violation.get('signal', ''),
+        law_info.get('name', ''),
+        str(law_info.get('article', '')),
+        law_info.get('excerpt', ''),
+        law_info.get('risk', ''),
+    ]
+
+
+_header_font = None
+
+
+def _get_header_font():
+    global _header_font
+    if _header_font is None:
+        from openpyxl.styles import Font
+        _header_font = Font(bold=True)
+    return _header_font
+
+
+def write_xlsx(target: IO[bytes], sheets: Iterable[Tuple[str, Iterable[Sequence[Any]]]],
+               headers: Sequence[str] = REPORT_HEADERS,
+               widths: Sequence[Tuple[str, int]] = REPORT_WIDTHS):
+    """
+    Записывает листы в XLSX потоково (write-only книга openpyxl): строки
+    не хранятся в памяти, объем памяти не зависит от их числа.
+
+    :param sheets: пары (название листа, строки)
+    """
+    # openpyxl импортируется только при генерации отчета, чтобы не замедлять старт API
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    for title, rows in sheets:
+        worksheet = add_sheet(workbook, title, headers, widths)
+        for row in rows:
+            worksheet.append(row)
+    workbook.save(target)
+
+
+def add_sheet(workbook, title: str, headers: Sequence[str], widths: Sequence[Tuple[str, int]]):
+    """Лист write-only книги с шириной колонок и жирной строкой заголовков."""
+    from openpyxl.cell import WriteOnlyCell
+
+    worksheet = workbook.create_sheet(title)
+    for letter, width in widths:
+        worksheet.column_dimensions[letter].width = width
+    font = _get_header_font()
+    header_row = []
+    for header in headers:
+        cell = WriteOnlyCell(worksheet, value=header)
+        cell.font = font
+        header_row.append(cell)
+    worksheet.append(header_row)
+    return worksheet
+
+
+def write_csv(target: IO[str], rows: Iterable[Sequence[Any]], headers: Sequence[str] = REPORT_HEADERS):
+    writer = csv.writer(target)
+    writer.writerow(headers)
+    writer.writerows(rows)
+
+
+def write_report_file(path: str, rows: Iterable[Sequence[Any]], fmt: str = 'xlsx'):
+    """Записывает отчет из готовых строк (violation_row) в файл в формате fmt."""
+    if fmt == 'xlsx':
+        with open(path, 'wb') as f:
+            write_xlsx(f, [(REPORT_SHEET, rows)])
+    elif fmt == 'csv':
+        with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+            write_csv(f, rows)
+    elif fmt == 'json':
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump([dict(zip(REPORT_HEADERS, row)) for row in rows], f, ensure_ascii=False)
+    else:
+        raise ValueError(f"Неизвестный формат отчета: {fmt}")
 
 
 class ReportService:
@@ -11,53 +135,28 @@ class ReportService:
         :param nlp_result: Результат из NLPService.analyze()
         :return: Данные Excel в виде bytes
         """
-        violations = nlp_result.get('violations', [])
-
-        # Создаем DataFrame только с нужными колонками
-        if not violations:
-            # Если нет нарушений, создаем пустой DataFrame с заголовками
-            df = pd.DataFrame(columns=[
-                'rule_id', 'rule_name', 'severity', 'category', 'signal',
-                'закон', 'статья', 'выдержка_описание', 'штраф'
-            ])
-        else:
-            violations_data = []
-            for v in violations:
-                law_info = v.get('law', {})
-                violation_data = {
-                    'rule_id': v.get('rule_id', ''),
-                    'rule_name': v.get('rule_name', ''),
-                    'severity': v.get('severity', ''),
-                    'category': v.get('category', ''),
-                    'signal': v.get('signal', ''),
-                    'закон': law_info.get('name', ''),
-                    'статья': str(law_info.get('article', '')),
-                    'выдержка_описание': law_info.get('excerpt', ''),
-                    'штраф': law_info.get('risk', '')
-                }
-                violations_data.append(violation_data)
-
-            df = pd.DataFrame(violations_data)
-
-        # Сохраняем в Excel с одним листом
+        rows = (violation_row(v) for v in nlp_result.get('violations', []))
         buf = io.BytesIO()
-        with pd.ExcelWriter(buf, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='Нарушения', index=False)
-
-            # Настраиваем ширину колонок для лучшего отображения
-            worksheet = writer.sheets['Нарушения']
-            worksheet.column_dimensions['A'].width = 15  # rule_id
-            worksheet.column_dimensions['B'].width = 35  # rule_name
-            worksheet.column_dimensions['C'].width = 12  # severity
-            worksheet.column_dimensions['D'].width = 15  # category
-            worksheet.column_dimensions['E'].width = 25  # signal
-            worksheet.column_dimensions['F'].width = 25  # закон
-            worksheet.column_dimensions['G'].width = 8  # статья
-            worksheet.column_dimensions['H'].width = 60  # выдержка_описание
-            worksheet.column_dimensions['I'].width = 40  # штраф
-
+        write_xlsx(buf, [(REPORT_SHEET, rows)])
         return buf.getvalue()
 
+    def violations_to_csv(self, nlp_result: Dict[str, Any]) -> bytes:
+        """Те же колонки в CSV (UTF-8 с BOM — Excel открывает кириллицу без настройки)."""
+        buf = io.StringIO()
+        write_csv(buf, (violation_row(v) for v in nlp_result.get('violations', [])))
+        return buf.getvalue().encode('utf-8-sig')
+
+    def violations_to_json(self, nlp_result: Dict[str, Any]) -> bytes:
+        """Нарушения списком объектов с ключами-колонками отчета."""
+        items = [dict(zip(REPORT_HEADERS, violation_row(v))) for v in nlp_result.get('violations', [])]
+        return json.dumps(items, ensure_ascii=False).encode('utf-8')
+
+    def export(self, nlp_result: Dict[str, Any], fmt: str = 'xlsx') -> bytes:
+        """Отчет в одном из REPORT_FORMATS."""
+        if fmt not in REPORT_FORMATS:
+            raise ValueError(f"Неизвестный формат отчета: {fmt}")
+        return getattr(self, f'violations_to_{fmt}')(nlp_result)
+
     # Метод для обратной совместимости
     def incidents_to_xlsx(self, incidents: List[Dict[str, Any]], total_risk: int = 0, risk_level: str = 'low') -> bytes:
         """
@@ -85,4 +184,4 @@ class ReportService:
             'pd_fields': {},
             'entities': {}
         }
-        return self.violations_to_xlsx(nlp_result)
\ No newline at end of file
+        return self.violations_to_xlsx(nlp_result)
@@ -0,0 +1,162 @@
+"""
+Отчеты по ID: строки отчета хранятся в БД, файлы строятся при первом скачивании.
+
+ID — хеш строк отчета, поэтому одинаковые отчеты (репосты, одинаковые наборы
+нарушений) хранятся и строятся один раз, а содержимое файла по ID неизменно:
+ETag известен без чтения файла.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.db.repository import delete_reports_before, load_report, save_reports
+from app.services.report_service import REPORT_TEMPLATE_VERSION, violation_row, write_report_file
+from app.services.single_flight import SingleFlight
+
+# Каталог готовых файлов отчетов
+REPORT_CACHE_DIR = os.getenv("REPORT_CACHE_DIR", "./data/reports")
+# Сколько файлов хранить; самые старые удаляются
+REPORT_CACHE_MAX_FILES = int(os.getenv("REPORT_CACHE_MAX_FILES", "1000"))
+# Сколько дней хранить отчет в БД после последнего сохранения (0 — бессрочно)
+REPORT_RETENTION_DAYS = float(os.getenv("REPORT_RETENTION_DAYS", "30"))
+# Раз в сколько сохранений удалять устаревшие отчеты
+REPORT_CLEANUP_EVERY = 100
+# Базовый путь ссылок на отчеты в ответах API
+REPORTS_URL_PREFIX = "/api/v1/reports"
+
+_REPORT_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+def report_rows(violations: List[Dict[str, Any]]) -> List[List[Any]]:
+    return [violation_row(v) for v in violations]
+
+
+def report_id_for(rows: Sequence[Sequence[Any]]) -> str:
+    payload = json.dumps(rows, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def is_report_id(value: str) -> bool:
+    return bool(_REPORT_ID.match(value))
+
+
+def report_url(report_id: str, fmt: str = 'xlsx') -> str:
+    return f"{REPORTS_URL_PREFIX}/{report_id}.{fmt}"
+
+
+def _mtime(path: Path) -> float:
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        # Файл уже удален другим процессом
+        return 0.0
+
+
+class ReportStore:
+    """
+    Файлы отчетов на диске с ленивой генерацией.
+    Одновременные скачивания одного файла ждут одну генерацию.
+    Отчеты старше retention_days удаляются из БД раз в REPORT_CLEANUP_EVERY сохранений.
+    """
+
+    def __init__(self, cache_dir: str = REPORT_CACHE_DIR, max_files: int = REPORT_CACHE_MAX_FILES,
+                 retention_days: float = REPORT_RETENTION_DAYS):
+        self.cache_dir = Path(cache_dir)
+        self.max_files = max_files
+        self.retention_days = retention_days
+        self._flights: SingleFlight[Path, Optional[Path]] = SingleFlight()
+        self._built = 0
+        self._saved = 0
+
+    async def save(self, violations: List[Dict[str, Any]]) -> str:
+        """Сохраняет отчет по нарушениям и возвращает его ID; файл не строится."""
+        return (await self.save_many([violations]))[0]
+
+    async def save_many(self, violations_list: List[List[Dict[str, Any]]]) -> List[str]:
+        """Сохраняет отчеты нескольких публикаций в одной транзакции; ID — в том же порядке."""
+        reports = {}
+        ids = []
+        for violations in violations_list:
+            rows = report_rows(violations)
+            report_id = report_id_for(rows)
+            reports[report_id] = rows
+            ids.append(report_id)
+        await save_reports(reports)
+        self._saved += 1
+        if self.retention_days > 0 and self._saved % REPORT_CLEANUP_EVERY == 0:
+            await self._expire()
+        return ids
+
+    async def _expire(self):
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        try:
+            deleted = await delete_reports_before(cutoff)
+        except Exception as e:
+            print(f"⚠️ Ошибка удаления устаревших отчетов: {e}")
+            return
+        if deleted:
+            print(f"🧹 Удалено устаревших отчетов: {deleted}")
+
+    @staticmethod
+    def etag(report_id: str, fmt: str) -> str:
+        return f'"{report_id}-{REPORT_TEMPLATE_VERSION}-{fmt}"'
+
+    def _path(self, report_id: str, fmt: str) -> Path:
+        return self.cache_dir / f"{report_id}-{REPORT_TEMPLATE_VERSION}.{fmt}"
+
+    async def get_file(self, report_id: str, fmt: str) -> Optional[Path]:
+        """Путь к файлу отчета (строится при первом запросе) или None, если отчета нет."""
+        path = self._path(report_id, fmt)
+        if path.exists():
+            return path
+
+        return await self._flights.run(path, lambda: self._load_and_build(report_id, path, fmt))
+
+    async def _load_and_build(self, report_id: str, path: Path, fmt: str) -> Optional[Path]:
+        rows = await load_report(report_id)
+        if rows is None:
+            return None
+        # Генерация файла — CPU-работа, выполняется в executor
+        await asyncio.get_running_loop().run_in_executor(None, self._build, path, rows, fmt)
+        return path
+
+    def _build(self, path: Path, rows: List[List[Any]], fmt: str):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Во временный файл и переименование: читатели не видят недописанный отчет
+        tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            write_report_file(str(tmp_path), rows, fmt)
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        self._built += 1
+        if self._built % 100 == 0:
+            self._prune()
+
+    def _prune(self):
+        files = sorted(
+            (p for p in self.cache_dir.iterdir() if not p.name.endswith('.tmp')),
+            key=_mtime,
+        )
+        for old in files[:max(0, len(files) - self.max_files)]:
+            try:
+                old.unlink()
+            except OSError:
+                pass
+
+
+_store: Optional[ReportStore] = None
+
+
+def get_report_store() -> ReportStore:
+    global _store
+    if _store is None:
+        _store = ReportStore()
+    return _store
@@ -0,0 +1,280 @@
+import re
+import yaml
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from app.services.matcher import PhraseMatcher
+
+# Ключи сущностей, которые возвращает NLPService.extract_entities
+ENTITY_TYPES = ('INN', 'phone', 'email', 'links')
+SEVERITIES = ('high', 'medium', 'low')
+CONDITION_KEYS = ('contains', 'not_contains', 'contains_pattern', 'requires_entity')
+
+
+class RuleCompileError(ValueError):
+    """Ошибка в описании правила, обнаруженная при компиляции."""
+
+
+class TextContext:
+    """
+    Данные одного текста, вычисляемые не более одного раза.
+
+    Нижний регистр, сущности, поля ПД и найденные фразы считаются лениво
+    и переиспользуются всеми правилами и вызывающим кодом.
+    """
+
+    def __init__(self, text: str,
+                 entity_extractor: Optional[Callable[[str], Dict[str, Any]]] = None,
+                 pd_detector: Optional[Callable[[str, str], Dict[str, bool]]] = None):
+        self.text = text
+        self._entity_extractor = entity_extractor
+        self._pd_detector = pd_detector
+        self._lower: Optional[str] = None
+        self._entities: Optional[Dict[str, Any]] = None
+        self._pd_fields: Optional[Dict[str, bool]] = None
+        self._hits: Dict[int, FrozenSet[int]] = {}
+
+    @property
+    def lower(self) -> str:
+        if self._lower is None:
+            self._lower = self.text.lower()
+        return self._lower
+
+    @property
+    def entities(self) -> Dict[str, Any]:
+        if self._entities is None:
+            self._entities = self._entity_extractor(self.text) if self._entity_extractor else {}
+        return self._entities
+
+    @property
+    def pd_fields(self) -> Dict[str, bool]:
+        if self._pd_fields is None:
+            # Детектору передается уже посчитанный нижний регистр
+            self._pd_fields = self._pd_detector(self.text, self.lower) if self._pd_detector else {}
+        return self._pd_fields
+
+    def search(self, pattern: re.Pattern) -> bool:
+        """Есть ли совпадение регулярного выражения в тексте."""
+        return pattern.search(self.text) is not None
+
+    def phrase_hits(self, matcher: PhraseMatcher) -> FrozenSet[int]:
+        """ID фраз автомата, найденных в тексте в нижнем регистре."""
+        key = id(matcher)
+        if key not in self._hits:
+            self._hits[key] = matcher.find_ids(self.lower)
+        return self._hits[key]
+
+
+# ====== Дерево условий ======
+class Condition:
+    """Узел дерева условий правила."""
+
+    def matches(self, ctx: TextContext, hits: FrozenSet[int]) -> bool:
+        raise NotImplementedError
+
+
+@dataclass(frozen=True)
+class ContainsAny(Condition):
+    """Хотя бы одна из фраз присутствует в тексте."""
+    phrase_ids: FrozenSet[int]
+
+    def matches(self, ctx: TextContext, hits: FrozenSet[int]) -> bool:
+        return not hits.isdisjoint(self.phrase_ids)
+
+
+@dataclass(frozen=True)
+class ContainsNone(Condition):
+    """Ни одна из фраз не присутствует в тексте."""
+    phrase_ids: FrozenSet[int]
+
+    def matches(self, ctx: TextContext, hits: FrozenSet[int]) -> bool:
+        return hits.isdisjoint(self.phrase_ids)
+
+
+@dataclass(frozen=True)
+class PatternAny(Condition):
+    """Хотя бы одно регулярное выражение находит совпадение."""
+    patterns: Tuple[re.Pattern, ...]
+
+    def matches(self, ctx: TextContext, hits: FrozenSet[int]) -> bool:
+        return any(ctx.search(p) for p in self.patterns)
+
+
+@dataclass(frozen=True)
+class EntitiesPresent(Condition):
+    """В тексте найдены все перечисленные сущности (ключи уже приведены к ENTITY_TYPES)."""
+    entity_types: Tuple[str, ...]
+
+    def matches(self, ctx: TextContext, hits: FrozenSet[int]) -> bool:
+        entities = ctx.entities
+        return all(entities.get(t) for t in self.entity_types)
+
+
+@dataclass(frozen=True)
+class AllOf(Condition):
+    """Все дочерние условия выполнены (корень дерева правила)."""
+    children: Tuple[Condition, ...]
+
+    def matches(self, ctx: TextContext, hits: FrozenSet[int]) -> bool:
+        return all(c.matches(ctx, hits) for c in self.children)
+
+
+@dataclass(frozen=True)
+class CompiledRule:
+    id: str
+    name: str
+    description: str
+    signal: str
+    severity: str
+    category: str
+    law: Dict[str, Any]
+    condition: Condition
+    raw: Dict[str, Any] = field(repr=False, compare=False)
+
+    def to_violation(self) -> Dict[str, Any]:
+        """Создает violation с полной юридической информацией."""
+        return {
+            'rule_id': self.id,
+            'rule_name': self.name,
+            'description': self.description,
+            'signal': self.signal,
+            'severity': self.severity,
+            'category': self.category,
+            'law': self.law
+        }
+
+
+class CompiledRuleSet:
+    """
+    Набор правил, скомпилированный один раз из YAML.
+
+    Все фразы собраны в один автомат, регулярные выражения предкомпилированы,
+    ошибки в правилах выявляются при компиляции, а не на каждом запросе.
+    """
+
+    def __init__(self, rules: Optional[List[Dict[str, Any]]], version: Any = None):
+        rules = rules or []
+        self.version = version
+
+        all_phrases = []
+        for rule in rules:
+            condition = rule.get('condition') if isinstance(rule, dict) else None
+            if isinstance(condition, dict):
+                for key in ('contains', 'not_contains'):
+                    value = condition.get(key)
+                    if isinstance(value, (list, str)):
+                        all_phrases.extend(_as_list(value))
+        self.matcher = PhraseMatcher(p for p in all_phrases if isinstance(p, str))
+
+        self.rules: Tuple[CompiledRule, ...] = tuple(self._compile_rules(rules))
+
+    @classmethod
+    def from_yaml(cls, path: Path, version: Any = None) -> "CompiledRuleSet":
+        """Загружает и компилирует правила из YAML файла."""
+        with open(path, 'r', encoding='utf-8') as f:
+            config = yaml.safe_load(f) or {}
+        return cls(config.get('rules', []), version=version if version is not None else config.get('version'))
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def _compile_rules(self, rules: List[Dict[str, Any]]) -> List[CompiledRule]:
+        compiled = []
+        seen_ids = set()
+        for index, rule in enumerate(rules):
+            if not isinstance(rule, dict):
+                raise RuleCompileError(f"Правило #{index}: ожидается словарь, получено {type(rule).__name__}")
+
+            for key in ('id', 'name', 'signal'):
+                if not rule.get(key):
+                    raise RuleCompileError(f"Правило #{index}: не задано поле '{key}'")
+
+            rule_id = rule['id']
+            if rule_id in seen_ids:
+                raise RuleCompileError(f"Правило {rule_id}: повторяющийся id")
+            seen_ids.add(rule_id)
+
+            severity = rule.get('severity', 'medium')
+            if severity not in SEVERITIES:
+                raise RuleCompileError(f"Правило {rule_id}: неизвестный severity '{severity}'")
+
+            compiled.append(CompiledRule(
+                id=rule_id,
+                name=rule['name'],
+                description=rule.get('description', ''),
+                signal=rule['signal'],
+                severity=severity,
+                category=rule.get('category', 'general'),
+                law=rule.get('law', {}),
+                condition=self._compile_condition(rule_id, rule.get('condition') or {}),
+                raw=rule,
+            ))
+        return compiled
+
+    def _compile_condition(self, rule_id: str, condition: Dict[str, Any]) -> Condition:
+        if not isinstance(condition, dict):
+            raise RuleCompileError(f"Правило {rule_id}: condition должен быть словарем")
+
+        unknown = set(condition) - set(CONDITION_KEYS)
+        if unknown:
+            raise RuleCompileError(f"Правило {rule_id}: неизвестные ключи условия {sorted(unknown)}")
+
+        # Порядок узлов — от дешевых проверок к дорогим
+        children: List[Condition] = []
+
+        if 'contains' in condition:
+            phrases = _phrase_list(rule_id, 'contains', condition['contains'])
+            children.append(ContainsAny(frozenset(self.matcher.phrase_id(p) for p in phrases)))
+
+        if 'not_contains' in condition:
+            phrases = _phrase_list(rule_id, 'not_contains', condition['not_contains'])
+            children.append(ContainsNone(frozenset(self.matcher.phrase_id(p) for p in phrases)))
+
+        if 'contains_pattern' in condition:
+            patterns = []
+            for pattern in _phrase_list(rule_id, 'contains_pattern', condition['contains_pattern']):
+                try:
+                    patterns.append(re.compile(pattern))
+                except re.error as e:
+                    raise RuleCompileError(f"Правило {rule_id}: некорректное выражение '{pattern}': {e}")
+            children.append(PatternAny(tuple(patterns)))
+
+        if 'requires_entity' in condition:
+            known = {t.lower(): t for t in ENTITY_TYPES}
+            required = _phrase_list(rule_id, 'requires_entity', condition['requires_entity'])
+            if not required:
+                raise RuleCompileError(f"Правило {rule_id}: пустой список requires_entity")
+            entity_types = []
+            for entity_type in required:
+                resolved = known.get(entity_type.lower())
+                if resolved is None:
+                    raise RuleCompileError(
+                        f"Правило {rule_id}: неизвестная сущность '{entity_type}', "
+                        f"допустимы: {', '.join(ENTITY_TYPES)}"
+                    )
+                entity_types.append(resolved)
+            children.append(EntitiesPresent(tuple(entity_types)))
+
+        return AllOf(tuple(children))
+
+    def matching_rules(self, ctx: TextContext) -> List[CompiledRule]:
+        """Правила, условия которых выполнены для текста."""
+        hits = ctx.phrase_hits(self.matcher)
+        return [rule for rule in self.rules if rule.condition.matches(ctx, hits)]
+
+    def evaluate(self, ctx: TextContext) -> List[Dict[str, Any]]:
+        """Применяет правила к тексту и возвращает список нарушений."""
+        return [rule.to_violation() for rule in self.matching_rules(ctx)]
+
+
+def _as_list(value) -> List:
+    return value if isinstance(value, list) else [value]
+
+
+def _phrase_list(rule_id: str, key: str, value) -> List[str]:
+    """Проверяет, что значение условия — строка или список строк."""
+    items = _as_list(value)
+    if not all(isinstance(item, str) for item in items):
+        raise RuleCompileError(f"Правило {rule_id}: '{key}' должен быть строкой или списком строк")
+    return items
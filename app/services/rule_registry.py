@@ -0,0 +1,139 @@
+import asyncio
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from app.services.rule_engine import CompiledRuleSet
+
+RULES_FILE_PATTERN = re.compile(r'^rules_(v\d+)\.ya?ml$')
+RULES_POLL_INTERVAL = float(os.getenv("RULES_POLL_INTERVAL", "2.0"))
+
+
+class UnknownRulesVersion(KeyError):
+    """Запрошена версия правил, которой нет в реестре."""
+
+
+def normalize_version(version: Union[str, int]) -> str:
+    """Приводит '6', 6 и 'v6' к единому виду 'v6'."""
+    version = str(version).strip().lower()
+    return f"v{version}" if version.isdigit() else version
+
+
+def _version_number(version: str) -> int:
+    digits = re.sub(r'\D', '', version)
+    return int(digits) if digits else -1
+
+
+class RuleRegistry:
+    """
+    Реестр версий правил из каталога app/rules.
+
+    Каждая версия компилируется один раз; при изменении файлов
+    перекомпилированный набор подменяется атомарной заменой словаря,
+    поэтому запросы в работе дорабатывают со своей версией без блокировок.
+    """
+
+    def __init__(self, rules_dir: Union[str, Path], default_version: Optional[str] = None):
+        self.rules_dir = Path(rules_dir)
+        if not self.rules_dir.is_absolute() and not self.rules_dir.exists():
+            self.rules_dir = Path(__file__).parent.parent.parent / rules_dir
+        self._pinned_default = normalize_version(default_version) if default_version else None
+
+        # Снимок {версия: набор правил}; заменяется целиком, никогда не изменяется на месте
+        self._rulesets: Dict[str, CompiledRuleSet] = {}
+        self._mtimes: Dict[str, Tuple[Path, float]] = {}
+        self._reload_lock = threading.Lock()
+        self._watch_task: Optional[asyncio.Task] = None
+
+        self.reload()
+
+    # ====== Доступ ======
+    @property
+    def default_version(self) -> Optional[str]:
+        rulesets = self._rulesets
+        if self._pinned_default and self._pinned_default in rulesets:
+            return self._pinned_default
+        if not rulesets:
+            return None
+        return max(rulesets, key=_version_number)
+
+    def versions(self) -> List[str]:
+        return sorted(self._rulesets, key=_version_number)
+
+    def get(self, version: Optional[Union[str, int]] = None) -> CompiledRuleSet:
+        """Возвращает скомпилированный набор правил (по умолчанию — последнюю версию)."""
+        rulesets = self._rulesets
+        key = normalize_version(version) if version is not None else self.default_version
+        if key is None or key not in rulesets:
+            raise UnknownRulesVersion(version)
+        return rulesets[key]
+
+    # ====== Перезагрузка ======
+    def _scan(self) -> Dict[str, Tuple[Path, float]]:
+        found = {}
+        if not self.rules_dir.is_dir():
+            return found
+        for path in self.rules_dir.iterdir():
+            match = RULES_FILE_PATTERN.match(path.name)
+            if match:
+                found[match.group(1)] = (path, path.stat().st_mtime)
+        return found
+
+    def reload(self) -> List[str]:
+        """
+        Перекомпилирует новые и измененные файлы правил.
+
+        Файл с ошибкой не заменяет ранее загруженную версию.
+        :return: Список обновленных версий
+        """
+        with self._reload_lock:
+            found = self._scan()
+            rulesets = dict(self._rulesets)
+            mtimes = dict(self._mtimes)
+            changed = []
+
+            for version, (path, mtime) in found.items():
+                if mtimes.get(version) == (path, mtime):
+                    continue
+                try:
+                    rulesets[version] = CompiledRuleSet.from_yaml(path, version=version)
+                    changed.append(version)
+                    print(f"[RuleRegistry] Скомпилированы правила {version}: {len(rulesets[version])} правил")
+                except Exception as e:
+                    print(f"[RuleRegistry] Ошибка компиляции {path}: {e}")
+                mtimes[version] = (path, mtime)
+
+            for version in set(rulesets) - set(found):
+                del rulesets[version]
+                mtimes.pop(version, None)
+                changed.append(version)
+                print(f"[RuleRegistry] Версия {version} удалена")
+
+            self._mtimes = mtimes
+            # Атомарная подмена снимка
+            self._rulesets = rulesets
+            return changed
+
+    async def watch(self, interval: float = RULES_POLL_INTERVAL):
+        """Периодически проверяет каталог правил и перекомпилирует изменения вне event loop."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.reload)
+            except Exception as e:
+                print(f"[RuleRegistry] Ошибка перезагрузки правил: {e}")
+
+    def start_watching(self, interval: float = RULES_POLL_INTERVAL):
+        if self._watch_task is None:
+            self._watch_task = asyncio.get_running_loop().create_task(self.watch(interval))
+
+    async def stop_watching(self):
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
@@ -0,0 +1,54 @@
+"""
+Объединение одновременных одинаковых вызовов: пока вычисление по ключу идет,
+остальные вызовы с тем же ключом ждут его результат, а не запускают свое.
+
+Отмена задачи, запустившей вычисление, не отменяет ожидающих: они повторяют
+попытку, и одна из них выполняет вычисление заново.
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class _LeaderCancelled(Exception):
+    """Задача, выполнявшая вычисление, отменена; ожидающим нужно повторить попытку."""
+
+
+class SingleFlight(Generic[K, V]):
+    def __init__(self):
+        self._inflight: Dict[K, asyncio.Future] = {}
+
+    def running(self, key: K) -> bool:
+        return key in self._inflight
+
+    async def run(self, key: K, compute: Callable[[], Awaitable[V]]) -> V:
+        """Результат compute() — своего вызова или уже идущего с тем же ключом."""
+        while True:
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            try:
+                # Отмена ожидающего не отменяет вычисление для остальных
+                return await asyncio.shield(inflight)
+            except _LeaderCancelled:
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Помечаем исключение полученным, даже если ожидающих нет
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
@@ -0,0 +1,291 @@
+import os
+import re
+from array import array
+from typing import TYPE_CHECKING, Any, Dict, FrozenSet, List, Optional, Tuple
+
+from app.services.matcher import PhraseMatcher
+from app.services.rule_engine import CompiledRule, CompiledRuleSet, ContainsAny, PatternAny, TextContext
+
+if TYPE_CHECKING:
+    from app.services.nlp_service import NLPService
+
+# Размер окна (в символах нормализованного текста), которое хранится между фрагментами.
+# Совпадения регулярных выражений длиннее окна могут быть обрезаны.
+STREAM_WINDOW = int(os.getenv("NLP_STREAM_WINDOW", "4096"))
+# Максимум сохраняемых совпадений (и значений сущностей) на фразу/шаблон
+STREAM_MAX_MATCHES = int(os.getenv("NLP_STREAM_MAX_MATCHES", "100"))
+# Запас символов перед началом поиска для \b и ретроспективных проверок
+_LOOKBEHIND = 16
+_NON_SPACE = re.compile(r'\S+')
+
+
+class _Tracked:
+    """Состояние поиска одного регулярного выражения по потоку."""
+    __slots__ = ('pattern', 'first_only', 'next_start', 'found', 'matches')
+
+    def __init__(self, pattern: re.Pattern, first_only: bool):
+        self.pattern = pattern
+        self.first_only = first_only
+        self.next_start = 0
+        self.found = False
+        self.matches: List[Tuple[Any, int, int]] = []
+
+
+class _Window:
+    """
+    Скользящее окно над нормализованным потоком.
+
+    Хранит хвост уже обработанного текста и исходное смещение каждого символа.
+    Совпадение принимается, только когда его начало отстоит от конца окна
+    больше чем на размер окна, поэтому результат совпадает с поиском по
+    всему тексту (для совпадений короче окна).
+    """
+
+    def __init__(self, size: int, max_matches: int):
+        self.size = size
+        self.max_matches = max_matches
+        self.buf = ''
+        self.pos = array('q')
+        self.base = 0  # индекс buf[0] в нормализованном потоке
+        self.tracked: Dict[Any, _Tracked] = {}
+
+    def track(self, key: Any, pattern: re.Pattern, first_only: bool = False):
+        self.tracked[key] = _Tracked(pattern, first_only)
+
+    def extend(self, text: str, positions: array):
+        self.buf += text
+        self.pos.extend(positions)
+
+    def scan(self, final: bool = False):
+        buf, base = self.buf, self.base
+        limit = len(buf) if final else len(buf) - self.size
+        if limit <= 0:
+            return
+
+        for t in self.tracked.values():
+            if t.first_only and t.found:
+                continue
+            pos = max(0, t.next_start - base)
+            while True:
+                m = t.pattern.search(buf, pos)
+                if m is None or m.start() >= limit:
+                    break
+                t.found = True
+                if len(t.matches) < self.max_matches:
+                    end = max(m.end(), m.start() + 1)
+                    t.matches.append((_match_value(m), self.pos[m.start()], self.pos[end - 1] + 1))
+                if t.first_only:
+                    break
+                pos = m.end() if m.end() > m.start() else m.start() + 1
+            t.next_start = base + max(pos, limit)
+
+        self._trim()
+
+    def _trim(self):
+        pending = [t.next_start - self.base for t in self.tracked.values() if not (t.first_only and t.found)]
+        cut = max(0, min(pending + [len(self.buf) - self.size]) - _LOOKBEHIND)
+        if cut:
+            self.buf = self.buf[cut:]
+            self.pos = self.pos[cut:]
+            self.base += cut
+
+
+def _match_value(m: re.Match) -> Any:
+    """Значение совпадения в том же виде, что возвращает re.findall."""
+    groups = m.re.groups
+    if groups == 0:
+        return m.group(0)
+    if groups == 1:
+        return m.group(1)
+    return m.groups()
+
+
+class _StreamContext(TextContext):
+    """Контекст правил, собранный из результатов потокового поиска."""
+
+    def __init__(self, hits: FrozenSet[int], entities: Dict[str, Any],
+                 pd_fields: Dict[str, bool], found_patterns: Dict[Tuple[str, int], bool]):
+        super().__init__('')
+        self._hits_all = hits
+        self._entities = entities
+        self._pd_fields = pd_fields
+        self._found_patterns = found_patterns
+
+    def search(self, pattern: re.Pattern) -> bool:
+        return self._found_patterns.get((pattern.pattern, pattern.flags), False)
+
+    def phrase_hits(self, matcher: PhraseMatcher) -> FrozenSet[int]:
+        return self._hits_all
+
+
+class StreamingAnalysis:
+    """
+    Потоковый анализ текста, поступающего фрагментами.
+
+    Нормализация пробелов, автомат фраз и регулярные выражения переносят
+    состояние через границы фрагментов; в памяти хранится только окно
+    фиксированного размера. Нарушения возвращаются со смещениями совпадений
+    в исходном тексте.
+    """
+
+    def __init__(self, service: "NLPService", ruleset: CompiledRuleSet,
+                 window: int = STREAM_WINDOW, max_matches: int = STREAM_MAX_MATCHES):
+        self.service = service
+        self.ruleset = ruleset
+        self.max_matches = max_matches
+
+        phrases = ruleset.matcher.phrases
+        size = max([window] + [len(p) for p in phrases])
+        self._norm = _Window(size, max_matches)
+        self._low = _Window(size, max_matches)
+
+        for name, pattern in service.ENTITY_PATTERNS.items():
+            self._norm.track(('entity', name), pattern)
+        for name, (pattern, on_lower) in service.PD_PATTERNS.items():
+            (self._low if on_lower else self._norm).track(('pd', name), pattern, first_only=True)
+        for kind, keywords in (('explicit', service.AD_EXPLICIT_KEYWORDS),
+                               ('implicit', service.AD_IMPLICIT_KEYWORDS)):
+            keyword_pattern = re.compile('|'.join(re.escape(k) for k in keywords))
+            self._low.track(('ad', kind), keyword_pattern, first_only=True)
+
+        # Одинаковые шаблоны разных правил ищутся один раз
+        for rule in ruleset.rules:
+            for pattern in _rule_patterns(rule):
+                key = ('pattern', (pattern.pattern, pattern.flags))
+                if key not in self._norm.tracked:
+                    self._norm.track(key, pattern)
+
+        self._state = 0
+        self._hits = set()
+        self._phrase_spans: Dict[int, List[Tuple[int, int]]] = {}
+        self._raw_offset = 0
+        self._started = False
+        self._pending_space: Optional[int] = None
+        self._finished = False
+
+    def feed(self, chunk: str):
+        """Обрабатывает очередной фрагмент исходного текста."""
+        if self._finished:
+            raise RuntimeError("Анализ уже завершен")
+
+        # Потоковый аналог preprocess(): strip + схлопывание пробельных символов.
+        # Текст обрабатывается словами, смещения символов слова — непрерывный диапазон.
+        norm_parts, low_parts = [], []
+        norm_pos, low_pos = array('q'), array('q')
+        raw0 = self._raw_offset
+        last = 0
+        for m in _NON_SPACE.finditer(chunk):
+            start, end = m.span()
+            if start > last and self._started and self._pending_space is None:
+                self._pending_space = raw0 + last
+            if self._pending_space is not None:
+                norm_parts.append(' ')
+                norm_pos.append(self._pending_space)
+                low_parts.append(' ')
+                low_pos.append(self._pending_space)
+                self._pending_space = None
+            self._started = True
+
+            word = m.group()
+            positions = range(raw0 + start, raw0 + end)
+            norm_parts.append(word)
+            norm_pos.extend(positions)
+            lowered = word.lower()
+            low_parts.append(lowered)
+            if len(lowered) == len(word):
+                low_pos.extend(positions)
+            else:
+                # Редкие символы меняют длину при lower() (например, «İ»)
+                for raw, ch in zip(positions, word):
+                    low_pos.extend([raw] * len(ch.lower()))
+            last = end
+
+        if len(chunk) > last and self._started and self._pending_space is None:
+            self._pending_space = raw0 + last
+        self._raw_offset = raw0 + len(chunk)
+
+        self._push(''.join(norm_parts), norm_pos, ''.join(low_parts), low_pos)
+
+    def _push(self, norm_text: str, norm_pos: array, low_text: str, low_pos: array, final: bool = False):
+        low = self._low
+        offset = len(low.buf)
+        low.extend(low_text, low_pos)
+
+        matches, self._state = self.ruleset.matcher.scan(low_text, self._state)
+        phrases = self.ruleset.matcher.phrases
+        for phrase_id, end in matches:
+            self._hits.add(phrase_id)
+            spans = self._phrase_spans.setdefault(phrase_id, [])
+            if len(spans) < self.max_matches:
+                end += offset
+                start = end - len(phrases[phrase_id]) + 1
+                spans.append((low.pos[start], low.pos[end] + 1))
+
+        low.scan(final)
+        self._norm.extend(norm_text, norm_pos)
+        self._norm.scan(final)
+
+    def finish(self) -> Dict[str, Any]:
+        """Завершает поток и возвращает результат в формате analyze() со смещениями нарушений."""
+        if not self._finished:
+            # Завершающие пробелы отбрасываются, как в text.strip()
+            self._push('', array('q'), '', array('q'), final=True)
+            self._finished = True
+
+        norm, low = self._norm.tracked, self._low.tracked
+        entities = {name: [m[0] for m in norm[('entity', name)].matches] for name in self.service.ENTITY_PATTERNS}
+        pd_fields = {
+            name: (low if on_lower else norm)[('pd', name)].found
+            for name, (_, on_lower) in self.service.PD_PATTERNS.items()
+        }
+        ad_info = self.service._ad_info(low[('ad', 'explicit')].found, low[('ad', 'implicit')].found)
+        found_patterns = {key[1]: t.found for key, t in norm.items() if key[0] == 'pattern'}
+
+        ctx = _StreamContext(frozenset(self._hits), entities, pd_fields, found_patterns)
+        violations = []
+        for rule in self.ruleset.matching_rules(ctx):
+            violation = rule.to_violation()
+            violation['spans'] = self._rule_spans(rule)
+            violations.append(violation)
+
+        risk_info = self.service._calculate_risk_level(violations)
+
+        return {
+            'length': self._raw_offset,
+            'entities': entities,
+            'ad_info': ad_info,
+            'pd_fields': pd_fields,
+            'violations': violations,
+            'violation_count': len(violations),
+            'rules_version': self.ruleset.version,
+            **risk_info
+        }
+
+    def _rule_spans(self, rule: CompiledRule) -> List[Dict[str, Any]]:
+        """Смещения совпадений фраз contains и шаблонов правила в исходном тексте."""
+        spans = []
+        phrases = self.ruleset.matcher.phrases
+        for node in _condition_nodes(rule):
+            if isinstance(node, ContainsAny):
+                for phrase_id in node.phrase_ids & self._hits:
+                    spans.extend(
+                        {'start': start, 'end': end, 'match': phrases[phrase_id]}
+                        for start, end in self._phrase_spans.get(phrase_id, [])
+                    )
+            elif isinstance(node, PatternAny):
+                for pattern in node.patterns:
+                    tracked = self._norm.tracked[('pattern', (pattern.pattern, pattern.flags))]
+                    spans.extend({'start': start, 'end': end, 'match': value} for value, start, end in tracked.matches)
+        spans.sort(key=lambda s: (s['start'], s['end']))
+        return spans[:self.max_matches]
+
+
+def _condition_nodes(rule: CompiledRule):
+    children = getattr(rule.condition, 'children', None)
+    return children if children is not None else (rule.condition,)
+
+
+def _rule_patterns(rule: CompiledRule):
+    for node in _condition_nodes(rule):
+        if isinstance(node, PatternAny):
+            yield from node.patterns
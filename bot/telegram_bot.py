@@ -1,24 +1,40 @@
 import os
+import time
 import asyncio
-import base64
-import tempfile
 import httpx
 from dotenv import load_dotenv
 
 from aiogram import Bot, Dispatcher, Router, types, F
-from aiogram.filters import CommandStart, Command
-from aiogram.types import FSInputFile, ReplyKeyboardMarkup, KeyboardButton
+from aiogram.filters import CommandStart, Command, CommandObject
+from aiogram.types import BufferedInputFile, ReplyKeyboardMarkup, KeyboardButton
 from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramBadRequest
 
-from bot.utils.fetch import fetch
-from bot.utils.escape_markdown import escape_markdown
+from bot.utils.fetch import fetch, start_fetcher, close_fetcher, parse_channel, telegram_configured
+from bot.utils.escape_markdown import escape_markdown, truncate_markdown
+from bot.utils.sse import iter_sse
+from bot.utils.audit import AUDIT_DEFAULT_POSTS, AUDIT_MAX_POSTS, ChatAuditLimiter, run_audit
 load_dotenv()
 
 
 # ====== Настройки ======
 BOT_TOKEN = os.getenv("TG_BOT_TOKEN")
-API_URL = "http://127.0.0.1:8000/api/v1/analyze/"
+API_BASE_URL = "http://127.0.0.1:8000"
+API_URL = f"{API_BASE_URL}/api/v1/analyze/"
 REPORT_ENDPOINT = f"{API_URL}report"
+REPORT_STREAM_ENDPOINT = f"{API_URL}report/stream"
+BATCH_ENDPOINT = f"{API_URL}batch"
+# Повторы запроса пачки аудита при перегрузке API (429)
+AUDIT_API_RETRIES = 3
+# Как часто обновлять сообщение с рекомендациями во время генерации (лимиты Telegram на edit)
+STREAM_EDIT_INTERVAL = 1.0
+# Максимальная длина сообщения Telegram
+TG_MESSAGE_LIMIT = 4096
+# Пул соединений с API: один клиент на все время работы бота
+API_TIMEOUT = float(os.getenv("BOT_API_TIMEOUT", "120"))
+API_MAX_CONNECTIONS = int(os.getenv("BOT_API_MAX_CONNECTIONS", "50"))
+API_MAX_KEEPALIVE = int(os.getenv("BOT_API_MAX_KEEPALIVE", "20"))
+API_KEEPALIVE_EXPIRY = float(os.getenv("BOT_API_KEEPALIVE_EXPIRY", "60"))
 
 if not BOT_TOKEN:
     raise ValueError("TG_BOT_TOKEN not provided.")
@@ -51,6 +67,75 @@ def get_back_to_main_keyboard():
     )
 
 
+# ====== HTTP-клиент API ======
+_http: httpx.AsyncClient | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Общий клиент API с keep-alive: соединения переиспользуются между сообщениями."""
+    global _http
+    if _http is None:
+        _http = httpx.AsyncClient(
+            timeout=API_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=API_MAX_CONNECTIONS,
+                max_keepalive_connections=API_MAX_KEEPALIVE,
+                keepalive_expiry=API_KEEPALIVE_EXPIRY,
+            ),
+        )
+    return _http
+
+
+async def close_http_client():
+    global _http
+    if _http is not None:
+        await _http.aclose()
+        _http = None
+
+
+class ServiceBusy(Exception):
+    """API отклонил запрос из-за перегрузки (429); аргумент — Retry-After в секундах."""
+
+
+# ====== Потоковые рекомендации ======
+class RecommendationMessage:
+    """
+    Сообщение с рекомендациями, которое дописывается по мере прихода фрагментов.
+    Во время генерации — простой текст с редкими правками, в конце — MarkdownV2.
+    """
+
+    def __init__(self, message: types.Message):
+        self.message = message
+        self.sent: types.Message | None = None
+        self.text = ""
+        self.last_edit = 0.0
+        self.finished = False
+
+    async def append(self, delta: str):
+        self.text += delta
+        if not self.text.strip() or time.monotonic() - self.last_edit < STREAM_EDIT_INTERVAL:
+            return
+        await self._show(f"💡 Рекомендации:\n{self.text}"[:TG_MESSAGE_LIMIT])
+
+    async def finish(self):
+        if self.finished or not self.text:
+            return
+        self.finished = True
+        text = truncate_markdown(f"💡 Рекомендации:\n{escape_markdown(self.text)}", TG_MESSAGE_LIMIT)
+        await self._show(text, parse_mode=ParseMode.MARKDOWN_V2)
+
+    async def _show(self, text: str, parse_mode=None):
+        self.last_edit = time.monotonic()
+        if self.sent is None:
+            self.sent = await self.message.answer(text, parse_mode=parse_mode)
+            return
+        try:
+            await self.sent.edit_text(text, parse_mode=parse_mode)
+        except TelegramBadRequest as e:
+            # «message is not modified» и подобные ошибки правки не критичны
+            print(f"⚠️ Не удалось обновить рекомендации: {e}")
+
+
 # ====== Хэндлеры ======
 @router.message(CommandStart())
 async def cmd_start(message: types.Message):
@@ -80,6 +165,7 @@ async def cmd_help(message: types.Message):
 1. 📊 Анализ текста - проверьте текст публикации
 2. 🔗 Анализ ссылки - проверьте пост по ссылке
 3. Или просто отправьте текст/ссылку
+4. /audit_channel <ссылка на канал> [N] - проверка последних N постов канала
 
 Бот проверит контент и выдаст отчет с нарушениями.
     """
@@ -110,6 +196,81 @@ async def request_link_analysis(message: types.Message):
     )
 
 
+# ====== Аудит канала ======
+audit_limiter = ChatAuditLimiter()
+
+
+async def analyze_texts(texts: list[str], client_id: str) -> list[dict]:
+    """Проверка пачки текстов правилами через /batch; при 429 — повтор после Retry-After."""
+    for attempt in range(AUDIT_API_RETRIES + 1):
+        resp = await get_http_client().post(BATCH_ENDPOINT, json={"texts": texts}, headers={"X-Client-Id": client_id})
+        if resp.status_code == 429 and attempt < AUDIT_API_RETRIES:
+            await asyncio.sleep(float(resp.headers.get("Retry-After", "5")))
+            continue
+        if resp.status_code == 429:
+            raise ServiceBusy(resp.headers.get("Retry-After", "несколько"))
+        resp.raise_for_status()
+        return resp.json()["items"]
+
+
+@router.message(Command("audit_channel"))
+async def cmd_audit_channel(message: types.Message, command: CommandObject):
+    """Аудит последних N постов публичного канала одним XLSX отчетом"""
+    args = (command.args or "").split()
+    channel = parse_channel(args[0]) if args else None
+    if channel is None or (len(args) > 1 and not args[1].isdigit()):
+        await message.answer(
+            f"Использование: /audit_channel <ссылка на канал> [N]\n"
+            f"Например: /audit_channel https://t.me/channel 200 (по умолчанию {AUDIT_DEFAULT_POSTS}, "
+            f"максимум {AUDIT_MAX_POSTS})"
+        )
+        return
+    if not telegram_configured():
+        await message.answer("⚠️ Ошибка: TG_API_ID или TG_API_HASH не заданы в окружении.")
+        return
+    limit = max(1, min(int(args[1]) if len(args) > 1 else AUDIT_DEFAULT_POSTS, AUDIT_MAX_POSTS))
+
+    chat_id = message.chat.id
+    refusal = audit_limiter.try_acquire(chat_id)
+    if refusal is not None:
+        if refusal.running:
+            await message.answer("⏳ В этом чате уже идет аудит. Дождитесь отчета.")
+        else:
+            await message.answer(f"⏳ Аудит в этом чате только что завершился. Повторите через {int(refusal.wait) + 1} с.")
+        return
+
+    status_msg = await message.answer(f"🔎 Аудит @{channel}: загружаю до {limit} постов...")
+
+    async def show_progress(stats):
+        try:
+            await status_msg.edit_text(stats.progress_text(channel))
+        except TelegramBadRequest:
+            # Текст не изменился или сообщение удалено — прогресс не критичен
+            pass
+
+    client_id = f"tg:{message.from_user.id}" if message.from_user else f"chat:{chat_id}"
+    try:
+        xlsx, stats = await run_audit(channel, limit, lambda texts: analyze_texts(texts, client_id), show_progress)
+        await show_progress(stats)
+        if not stats.analyzed:
+            await message.answer("⚠️ В канале не найдено постов с текстом (или канал приватный).")
+            return
+        await message.answer_document(
+            BufferedInputFile(xlsx, filename=f"audit_{channel}.xlsx"),
+            caption=f"📎 Аудит @{channel}: {stats.analyzed} постов, с нарушениями — {stats.with_violations}"
+        )
+    except ServiceBusy as e:
+        await status_msg.edit_text(f"🚦 Сервис перегружен. Повторите через {e} с.")
+    except httpx.TimeoutException:
+        await status_msg.edit_text("⏰ Превышено время ожидания.")
+    except httpx.RequestError as e:
+        await status_msg.edit_text(f"🔌 Ошибка соединения: {e}")
+    except Exception as e:
+        await status_msg.edit_text(f"❌ Ошибка аудита: {e}")
+    finally:
+        audit_limiter.release(chat_id)
+
+
 @router.message()
 async def handle_text(message: types.Message):
     """Основной обработчик текста и ссылок"""
@@ -141,46 +302,62 @@ async def handle_text(message: types.Message):
         analysis_text = text
 
     try:
-        # Асинхронный запрос к API
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            resp = await client.post(REPORT_ENDPOINT, json={"text": analysis_text})
+        recommendations = RecommendationMessage(message)
+
+        # Потоковый запрос к API: результаты правил приходят сразу, рекомендации — по мере генерации
+        client = get_http_client()
+        # Лимиты API считаются по пользователю, а не по адресу бота
+        headers = {"X-Client-Id": f"tg:{message.from_user.id}"} if message.from_user else {}
+        async with client.stream(
+            "POST", REPORT_STREAM_ENDPOINT, json={"text": analysis_text}, headers=headers
+        ) as resp:
+            if resp.status_code == 429:
+                raise ServiceBusy(resp.headers.get("Retry-After", "несколько"))
             resp.raise_for_status()
-            data = resp.json()
-
-        incidents = data.get("incidents", [])
-        total_risk = data.get("total_risk", 0)
-        risk_level = data.get("risk_level", "low")
-        xlsx_base64 = data.get("xlsx_base64")
-        recommendations = data.get("recommendations", "")
-
-        # Форматируем сообщение с результатами
-        results_text = f"""
+            async for event, data in iter_sse(resp):
+                if event == "analysis":
+                    incidents = data.get("incidents", [])
+                    total_risk = data.get("total_risk", 0)
+                    risk_level = data.get("risk_level", "low")
+
+                    # Форматируем сообщение с результатами
+                    results_text = f"""
 ✅ Результаты анализа:
 
 📊 Тип: {content_type}
 🚨 Нарушений: {len(incidents)}
 ⚡ Риск: {total_risk} ({risk_level})
         """
+                    if data.get("degraded"):
+                        results_text += "\n⚠️ Высокая нагрузка: проверка выполнена только по правилам"
+
+                    await status_msg.edit_text(results_text)
 
-        await status_msg.edit_text(results_text)
+                elif event == "recommendation":
+                    await recommendations.append(data.get("delta", ""))
 
-        # Отправка рекомендаций
-        if recommendations:
-            await message.answer(f"💡 Рекомендации:\n{escape_markdown(recommendations)}", parse_mode=ParseMode.MARKDOWN_V2)
+                elif event == "report":
+                    await recommendations.finish()
 
-        # Отправка XLSX отчета
-        if xlsx_base64:
-            xlsx_bytes = base64.b64decode(xlsx_base64)
-            with tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False) as tmp_file:
-                tmp_file.write(xlsx_bytes)
-                tmp_file_path = tmp_file.name
+                    # Отправка XLSX отчета из памяти, без временного файла
+                    report_url = data.get("report_url")
+                    if report_url:
+                        report_resp = await client.get(f"{API_BASE_URL}{report_url}")
+                        report_resp.raise_for_status()
+                        await message.answer_document(
+                            BufferedInputFile(
+                                report_resp.content, filename=data.get("filename", "security_report.xlsx")
+                            ),
+                            caption="📎 Детальный отчет"
+                        )
 
-            await message.answer_document(
-                FSInputFile(tmp_file_path, filename="security_report.xlsx"),
-                caption="📎 Детальный отчет"
-            )
-            os.remove(tmp_file_path)
+                elif event == "error":
+                    raise RuntimeError(data.get("detail", "ошибка анализа"))
 
+        await recommendations.finish()
+
+    except ServiceBusy as e:
+        await status_msg.edit_text(f"🚦 Сервис перегружен. Повторите через {e} с.")
     except httpx.TimeoutException:
         await status_msg.edit_text("⏰ Превышено время ожидания.")
     except httpx.RequestError as e:
@@ -195,8 +372,14 @@ async def handle_text(message: types.Message):
 # ====== Точка входа ======
 async def main():
     """Запуск бота"""
+    # Один клиент Telegram на все запросы ссылок: подключение и вход — один раз при старте
+    await start_fetcher()
     print("🤖 Бот запущен!")
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await close_http_client()
+        await close_fetcher()
 
 
 if __name__ == "__main__":
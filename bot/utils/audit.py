@@ -0,0 +1,211 @@
+"""
+Аудит канала: последние N постов проверяются пачками и сводятся в один XLSX.
+
+Посты читаются страницами и через ограниченную очередь передаются нескольким
+воркерам анализа; строки отчета сразу пишутся в write-only книгу. В памяти —
+не больше нескольких пачек постов, сколько бы постов ни было в канале.
+"""
+import asyncio
+import io
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from bot.utils.fetch import Post, get_fetcher
+
+AUDIT_DEFAULT_POSTS = int(os.getenv("AUDIT_DEFAULT_POSTS", "100"))
+AUDIT_MAX_POSTS = int(os.getenv("AUDIT_MAX_POSTS", "5000"))
+# Постов в одном запросе к /batch
+AUDIT_CHUNK_SIZE = int(os.getenv("AUDIT_CHUNK_SIZE", "25"))
+# Запросов к API одного аудита одновременно
+AUDIT_CONCURRENCY = int(os.getenv("AUDIT_CONCURRENCY", "3"))
+# Как часто обновлять сообщение с прогрессом (лимиты Telegram на edit), секунды
+AUDIT_PROGRESS_INTERVAL = float(os.getenv("AUDIT_PROGRESS_INTERVAL", "3"))
+# Пауза между аудитами в одном чате, секунды
+AUDIT_CHAT_COOLDOWN = float(os.getenv("AUDIT_CHAT_COOLDOWN", "60"))
+# Символов текста поста в отчете
+AUDIT_TEXT_PREVIEW = 300
+
+# Колонки отчета и ширина; строка на каждую пару (пост, нарушение), пост без нарушений — одна строка
+AUDIT_COLUMNS = (
+    ('post_id', 10),
+    ('дата', 18),
+    ('ссылка', 35),
+    ('risk_level', 10),
+    ('total_risk', 10),
+    ('rule_id', 15),
+    ('rule_name', 35),
+    ('severity', 12),
+    ('category', 15),
+    ('signal', 25),
+    ('закон', 25),
+    ('статья', 8),
+    ('текст', 60),
+)
+
+AnalyzeBatch = Callable[[List[str]], Awaitable[List[Dict[str, Any]]]]
+
+
+@dataclass
+class AuditStats:
+    limit: int
+    fetched: int = 0
+    analyzed: int = 0
+    skipped: int = 0  # посты без текста
+    with_violations: int = 0
+    violations: int = 0
+
+    def progress_text(self, channel: str) -> str:
+        return (
+            f"🔎 Аудит @{channel}\n"
+            f"📥 Загружено постов: {self.fetched} из {self.limit}\n"
+            f"🧪 Проверено: {self.analyzed}\n"
+            f"🚨 С нарушениями: {self.with_violations} (нарушений: {self.violations})"
+        )
+
+
+class AuditWorkbook:
+    """Сводный XLSX аудита (write-only книга: строки сразу уходят во временный файл листа)."""
+
+    def __init__(self, channel: str):
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font
+        from openpyxl.utils import get_column_letter
+
+        self.channel = channel
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet("Аудит")
+        for i, (_, width) in enumerate(AUDIT_COLUMNS, start=1):
+            self.sheet.column_dimensions[get_column_letter(i)].width = width
+        font = Font(bold=True)
+        header = []
+        for name, _ in AUDIT_COLUMNS:
+            cell = WriteOnlyCell(self.sheet, value=name)
+            cell.font = font
+            header.append(cell)
+        self.sheet.append(header)
+
+    def add_post(self, post: Post, item: Dict[str, Any]):
+        from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+        preview = ILLEGAL_CHARACTERS_RE.sub('', post.text[:AUDIT_TEXT_PREVIEW])
+        date = post.date.replace(tzinfo=None) if post.date else None
+        head = [post.id, date, f"https://t.me/{self.channel}/{post.id}",
+                item.get("risk_level"), item.get("total_risk")]
+        incidents = item.get("incidents") or []
+        if not incidents:
+            self.sheet.append(head + [None] * 7 + [preview])
+            return
+        for incident in incidents:
+            law = incident.get("law") or {}
+            self.sheet.append(head + [
+                incident.get("rule_id"), incident.get("rule_name"), incident.get("severity"),
+                incident.get("category"), incident.get("signal"),
+                law.get("name"), str(law.get("article", "")), preview,
+            ])
+
+    def to_bytes(self) -> bytes:
+        buf = io.BytesIO()
+        self.workbook.save(buf)
+        return buf.getvalue()
+
+
+@dataclass
+class AuditRefusal:
+    """Почему аудит нельзя начать: в чате уже идет аудит или еще не прошла пауза wait секунд."""
+    running: bool
+    wait: float = 0.0
+
+
+class ChatAuditLimiter:
+    """Не больше одного аудита на чат и пауза AUDIT_CHAT_COOLDOWN между ними."""
+
+    def __init__(self, cooldown: float = AUDIT_CHAT_COOLDOWN):
+        self.cooldown = cooldown
+        self._running = set()
+        self._finished_at: Dict[int, float] = {}
+
+    def try_acquire(self, chat_id: int) -> Optional[AuditRefusal]:
+        """None — аудит можно начинать; иначе — причина отказа."""
+        if chat_id in self._running:
+            return AuditRefusal(running=True)
+        wait = self._finished_at.get(chat_id, 0.0) + self.cooldown - time.monotonic()
+        if wait > 0:
+            return AuditRefusal(running=False, wait=wait)
+        self._running.add(chat_id)
+        return None
+
+    def release(self, chat_id: int):
+        self._running.discard(chat_id)
+        self._finished_at[chat_id] = time.monotonic()
+        # Старые отметки больше не ограничивают — не копим их
+        deadline = time.monotonic() - self.cooldown
+        for stale in [c for c, t in self._finished_at.items() if t < deadline]:
+            del self._finished_at[stale]
+
+
+async def run_audit(channel: str, limit: int, analyze: AnalyzeBatch,
+                    on_progress: Callable[[AuditStats], Awaitable[None]],
+                    concurrency: int = AUDIT_CONCURRENCY,
+                    chunk_size: int = AUDIT_CHUNK_SIZE) -> Tuple[bytes, AuditStats]:
+    """
+    Проверяет последние limit постов канала.
+    :param analyze: тексты → элементы ответа /batch в том же порядке
+    :param on_progress: вызывается не чаще AUDIT_PROGRESS_INTERVAL
+    :return: (XLSX в байтах, статистика)
+    """
+    stats = AuditStats(limit=limit)
+    workbook = await asyncio.to_thread(AuditWorkbook, channel)
+    # Ограниченная очередь: чтение канала ждет, пока анализ не разберет пачки
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    last_progress = 0.0
+
+    async def report_progress():
+        nonlocal last_progress
+        if time.monotonic() - last_progress >= AUDIT_PROGRESS_INTERVAL:
+            last_progress = time.monotonic()
+            await on_progress(stats)
+
+    async def produce():
+        chunk: List[Post] = []
+        async for post in get_fetcher().iter_posts(channel, limit):
+            stats.fetched += 1
+            if not post.text:
+                stats.skipped += 1
+                continue
+            chunk.append(post)
+            if len(chunk) == chunk_size:
+                await queue.put(chunk)
+                chunk = []
+        if chunk:
+            await queue.put(chunk)
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def work():
+        while True:
+            chunk: Optional[Sequence[Post]] = await queue.get()
+            if chunk is None:
+                return
+            items = await analyze([post.text for post in chunk])
+            for post, item in zip(chunk, items):
+                workbook.add_post(post, item)
+                stats.analyzed += 1
+                count = len(item.get("incidents") or [])
+                if count:
+                    stats.with_violations += 1
+                    stats.violations += count
+            await report_progress()
+
+    tasks = [asyncio.ensure_future(produce())] + [asyncio.ensure_future(work()) for _ in range(concurrency)]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    return await asyncio.to_thread(workbook.to_bytes), stats
@@ -6,3 +6,17 @@ def escape_markdown(text: str) -> str:
     """
     escape_chars = r'_*\[\]()~`>#+-=|{}.!'
     return re.sub(f'([{re.escape(escape_chars)}])', r'\\\1', text)
+
+
+def truncate_markdown(text: str, limit: int) -> str:
+    """
+    Обрезает экранированный MarkdownV2-текст до limit символов с многоточием,
+    не разрывая экранирование (обратный слеш и следующий за ним символ).
+    """
+    if len(text) <= limit:
+        return text
+    cut = text[:limit - 1]
+    trailing = len(cut) - len(cut.rstrip('\\'))
+    if trailing % 2:
+        cut = cut[:-1]
+    return cut + '…'
@@ -1,13 +1,183 @@
 import re
 import os
+import time
+import asyncio
+from collections import OrderedDict
+from datetime import datetime
+from typing import AsyncIterator, NamedTuple, Optional, Tuple
+
 from telethon import TelegramClient
 from dotenv import load_dotenv
 
+from bot.utils.single_flight import SingleFlight
+
 load_dotenv()
 
 # Получаем ключи из переменных окружения
 API_ID = os.getenv("TG_API_ID")
 API_HASH = os.getenv("TG_API_HASH")
+SESSION_NAME = "session_ai_impulse"
+
+# Кэш текстов постов: сколько хранить и как долго (посты редактируют редко), секунды
+FETCH_CACHE_SIZE = int(os.getenv("FETCH_CACHE_SIZE", "512"))
+FETCH_CACHE_TTL = float(os.getenv("FETCH_CACHE_TTL", "600"))
+
+# Сообщений за один запрос истории канала (лимит Telegram — 100)
+HISTORY_PAGE_SIZE = 100
+
+POST_LINK = re.compile(r"https?://t\.me/([\w_]+)/(\d+)")
+# Публичный канал: https://t.me/<channel>[/...], t.me/s/<channel> или @<channel>
+CHANNEL_LINK = re.compile(r"^(?:(?:https?://)?t\.me/(?:s/)?|@)?([A-Za-z][\w_]{3,})(?:/\d*)?/?$")
+
+PostKey = Tuple[str, int]
+
+
+class Post(NamedTuple):
+    id: int
+    date: Optional[datetime]
+    text: str
+
+
+def parse_channel(link: str) -> Optional[str]:
+    """Имя публичного канала из ссылки или @имени; None — ссылка не на публичный канал."""
+    match = CHANNEL_LINK.match(link.strip())
+    return match.group(1) if match else None
+
+
+def telegram_configured() -> bool:
+    return bool(API_ID and API_HASH)
+
+
+class PostFetcher:
+    """
+    Один долгоживущий клиент Telethon на весь бот.
+
+    Подключение и авторизация выполняются один раз при старте; запросы к
+    клиенту идут по очереди под блокировкой (одна сессия — один поток запросов).
+    Тексты постов хранятся в LRU-кэше с TTL по (канал, ID поста), одновременные
+    запросы одного поста ждут один вызов get_messages.
+    """
+
+    def __init__(self, cache_size: int = FETCH_CACHE_SIZE, cache_ttl: float = FETCH_CACHE_TTL):
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._client: Optional[TelegramClient] = None
+        self._lock = asyncio.Lock()
+        self._cache: "OrderedDict[PostKey, Tuple[str, float]]" = OrderedDict()
+        self._flights: SingleFlight[PostKey, Optional[str]] = SingleFlight()
+
+    # --- клиент ---
+    async def start(self):
+        """Подключает клиента (при первом запуске — вход по сохраненной сессии или интерактивно)."""
+        async with self._lock:
+            await self._ensure_client()
+
+    async def _ensure_client(self) -> TelegramClient:
+        # Вызывается под self._lock
+        if self._client is None:
+            self._client = TelegramClient(SESSION_NAME, API_ID, API_HASH)
+            await self._client.start()
+        elif not self._client.is_connected():
+            await self._client.connect()
+        return self._client
+
+    async def close(self):
+        async with self._lock:
+            if self._client is not None:
+                await self._client.disconnect()
+                self._client = None
+
+    # --- кэш ---
+    def _get_cached(self, key: PostKey) -> Optional[str]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        text, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return text
+
+    def _put_cached(self, key: PostKey, text: str):
+        self._cache[key] = (text, time.monotonic() + self.cache_ttl)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    # --- посты ---
+    async def iter_posts(self, channel: str, limit: int,
+                         page_size: int = HISTORY_PAGE_SIZE) -> AsyncIterator[Post]:
+        """
+        Последние limit сообщений канала, от новых к старым, страницами по page_size.
+        Клиент блокируется на время одной страницы, а не всего канала: запросы
+        ссылок от других пользователей не ждут окончания аудита.
+        """
+        offset_id = 0
+        remaining = limit
+        while remaining > 0:
+            page_limit = min(page_size, remaining)
+            async with self._lock:
+                client = await self._ensure_client()
+                page = [message async for message in client.iter_messages(
+                    channel, limit=page_limit, offset_id=offset_id
+                )]
+            for message in page:
+                # В кэш ссылок посты аудита не попадают: тысячи постов одного канала
+                # вытеснили бы ссылки остальных пользователей
+                yield Post(message.id, message.date, message_text(message))
+            if len(page) < page_limit:
+                return
+            offset_id = page[-1].id
+            remaining -= len(page)
+
+    async def get_post(self, channel: str, post_id: int) -> Optional[str]:
+        """Текст поста или None, если пост недоступен (канал приватный или пост удален)."""
+        key = (channel.lower(), post_id)
+        text = self._get_cached(key)
+        if text is not None:
+            return text
+
+        return await self._flights.run(key, lambda: self._load_post(key, channel, post_id))
+
+    async def _load_post(self, key: PostKey, channel: str, post_id: int) -> Optional[str]:
+        async with self._lock:
+            client = await self._ensure_client()
+            message = await client.get_messages(channel, ids=post_id)
+        text = message_text(message) if message else None
+        if text is not None:
+            self._put_cached(key, text)
+        return text
+
+
+def message_text(message) -> str:
+    text = message.text or ""
+    if message.media and getattr(message, "caption", None):
+        text += f"\n\n{message.caption}"
+    return text.strip()
+
+
+_fetcher: Optional[PostFetcher] = None
+
+
+def get_fetcher() -> PostFetcher:
+    global _fetcher
+    if _fetcher is None:
+        _fetcher = PostFetcher()
+    return _fetcher
+
+
+async def start_fetcher():
+    """Подключает клиента Telegram при старте бота (без ключей — пропускается)."""
+    if not telegram_configured():
+        print("⚠️ TG_API_ID или TG_API_HASH не заданы: анализ ссылок недоступен")
+        return
+    await get_fetcher().start()
+
+
+async def close_fetcher():
+    if _fetcher is not None:
+        await _fetcher.close()
 
 
 async def fetch(channel_url: str):
@@ -17,30 +187,21 @@ async def fetch(channel_url: str):
     """
 
     # Проверяем, является ли входная строка ссылкой на Telegram
-    pattern = r"https?://t\.me/([\w_]+)/(\d+)"
-    match = re.match(pattern, channel_url)
+    match = POST_LINK.match(channel_url)
     if not match:
         return channel_url  # если это не ссылка — вернуть сам текст
 
     channel, post_id = match.groups()
 
     # Проверяем, заданы ли ключи
-    if not API_ID or not API_HASH:
+    if not telegram_configured():
         return "⚠️ Ошибка: TG_API_ID или TG_API_HASH не заданы в окружении."
 
     try:
-        # Открываем сессию клиента
-        async with TelegramClient("session_ai_impulse", API_ID, API_HASH) as client:
-            message = await client.get_messages(channel, ids=int(post_id))
-
-            if not message:
-                return "⚠️ Не удалось получить сообщение (возможно, канал приватный или пост удалён)."
-
-            text = message.text or ""
-            if message.media and getattr(message, "caption", None):
-                text += f"\n\n{message.caption}"
-
-            return text.strip()
+        text = await get_fetcher().get_post(channel, int(post_id))
+        if text is None:
+            return "⚠️ Не удалось получить сообщение (возможно, канал приватный или пост удалён)."
+        return text
 
     except Exception as e:
         return f"⚠️ Ошибка при получении поста: {e}"
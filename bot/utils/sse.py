@@ -0,0 +1,25 @@
+import json
+from typing import AsyncIterator, Tuple
+
+import httpx
+
+
+async def iter_sse(response: httpx.Response) -> AsyncIterator[Tuple[str, dict]]:
+    """
+    Разбирает поток Server-Sent Events из ответа httpx.
+    Возвращает пары (имя события, JSON-данные события).
+    """
+    event, data_lines = "message", []
+    async for line in response.aiter_lines():
+        if not line:
+            # Пустая строка завершает событие
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].lstrip())
+
+    if data_lines:
+        yield event, json.loads("\n".join(data_lines))
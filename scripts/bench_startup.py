@@ -0,0 +1,76 @@
+"""
+Бенчмарк холодного старта API.
+
+Замеряет время `import app.main` в отдельных процессах и проверяет,
+что тяжелые зависимости не загружаются при импорте.
+
+Запуск:
+    python scripts/bench_startup.py --runs 5 --max-seconds 1.5
+Код возврата 1, если медиана превышает бюджет или загружен запрещенный модуль.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Модули, которые не должны импортироваться при старте API
+FORBIDDEN_MODULES = ("sklearn", "pandas", "openpyxl", "openai", "numpy", "scipy")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+loaded = sorted({name.split('.')[0] for name in sys.modules})
+print(json.dumps({"elapsed": elapsed, "loaded": loaded}))
+"""
+
+
+def measure_once() -> dict:
+    """Импортирует app.main в чистом интерпретаторе и возвращает время и список модулей."""
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк времени импорта app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=1.5, help="бюджет на медиану времени импорта")
+    args = parser.parse_args()
+
+    timings = []
+    loaded = set()
+    for _ in range(args.runs):
+        result = measure_once()
+        timings.append(result["elapsed"])
+        loaded.update(result["loaded"])
+
+    median = statistics.median(timings)
+    print(f"import app.main: median {median:.3f}s, min {min(timings):.3f}s, max {max(timings):.3f}s ({args.runs} runs)")
+
+    failed = False
+    heavy = sorted(set(FORBIDDEN_MODULES) & loaded)
+    if heavy:
+        print(f"❌ При старте загружены тяжелые модули: {', '.join(heavy)}")
+        failed = True
+    if median > args.max_seconds:
+        print(f"❌ Медиана превышает бюджет {args.max_seconds:.3f}s")
+        failed = True
+
+    if not failed:
+        print("✅ Холодный старт в пределах бюджета")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())